@@ -4,6 +4,7 @@ from typing import List
 from typing_extensions import Annotated
 
 from cnc.models import BuildStageManager
+from cnc.models.render_profiler import profiler
 from .telemetry import send_event
 
 from cnc.logger import get_logger
@@ -50,8 +51,27 @@ def perform(
         "-p",
         help="Enable parallel build",
     ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Only rewrite generated files whose content changed (use with --no-cleanup)",
+    ),
+    render_workers: int = typer.Option(
+        1,
+        "--render-workers",
+        envvar="CNC_RENDER_WORKERS",
+        help="Number of services to render scripts for concurrently",
+    ),
+    profile_render: bool = typer.Option(
+        False,
+        "--profile-render",
+        help="Profile template rendering and print a summary at the end",
+    ),
 ):
     """Build containers for config-defined services"""
+    if profile_render:
+        profiler.enable()
+
     start_time = time.time()
     send_event("build.perform")
     collection = ctx.obj.application.collection_by_name(collection_name)
@@ -68,6 +88,8 @@ def perform(
         environment,
         service_tags=service_tags,
         default_tag=default_tag,
+        incremental=incremental,
+        render_workers=render_workers,
         webhook_url=webhook_url,
         webhook_token=webhook_token,
         parallel_exec_enabled=parallel,
@@ -1,8 +1,6 @@
 import os
 
-from tabulate import tabulate
 import typer
-import toml
 
 from .telemetry import send_event
 
@@ -14,6 +12,12 @@ log = get_logger(__name__)
 app = typer.Typer()
 
 
+def print_table(table_data, headers):
+    from tabulate import tabulate
+
+    print(tabulate(table_data, headers, tablefmt="grid"))
+
+
 @app.command("version")
 def version_info(
     ctx: typer.Context,
@@ -28,6 +32,8 @@ def version_info(
         # Construct the full path to the pyproject.toml file
         file_path = os.path.join(dir_path, "pyproject.toml")
 
+        import toml
+
         with open(file_path, "r") as f:
             pyproject = toml.load(f)
         return pyproject["tool"]["poetry"]["version"]
@@ -53,7 +59,7 @@ def application_info(
     headers = list(data.keys())
     table_data = [list(data.values())]
 
-    print(tabulate(table_data, headers, tablefmt="grid"))
+    print_table(table_data, headers)
 
     raise typer.Exit()
 
@@ -79,7 +85,7 @@ def environments(
     if env_datas:
         headers = list(env_datas[0].keys())
         table_data = [list(d.values()) for d in env_datas]
-        print(tabulate(table_data, headers, tablefmt="grid"))
+        print_table(table_data, headers)
     else:
         print(f"No environments for {collection}")
 
@@ -113,7 +119,7 @@ def services(
     if svc_datas:
         headers = list(svc_datas[0].keys())
         table_data = [list(d.values()) for d in svc_datas]
-        print(tabulate(table_data, headers, tablefmt="grid"))
+        print_table(table_data, headers)
     else:
         print(f"No services for {environment}")
 
@@ -1,9 +1,9 @@
 from typing import List
 import typer
-import yaml
-from collections import OrderedDict
 
 from cnc.models import ProvisionStageManager
+from cnc.models.render_profiler import profiler
+from cnc.utils.yaml_io import ordered_load, ordered_dump
 from .telemetry import send_event
 
 from cnc.logger import get_logger
@@ -14,39 +14,22 @@ log = get_logger(__name__)
 app = typer.Typer()
 
 
-def ordered_load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
-    class OrderedLoader(Loader):
-        pass
-
-    def construct_ordered_mapping(loader, node):
-        loader.flatten_mapping(node)
-        return object_pairs_hook(loader.construct_pairs(node))
-
-    OrderedLoader.add_constructor(
-        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_ordered_mapping
-    )
-    return yaml.load(stream, OrderedLoader)
-
-
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
-    class OrderedDumper(Dumper):
-        pass
-
-    def _dict_representer(dumper, data):
-        return dumper.represent_dict(data.items())
-
-    OrderedDumper.add_representer(OrderedDict, _dict_representer)
-    return yaml.dump(data, stream, OrderedDumper, **kwds)
-
-
 @app.callback()
 def add_common(
     ctx: typer.Context,
     collection_name: str = typer.Option(
         default=None, envvar="CNC_COLLECTION_NAME", help="Collection name"
     ),
+    profile_render: bool = typer.Option(
+        False,
+        "--profile-render",
+        help="Profile template rendering and print a summary at the end",
+    ),
 ):
     """Common Entry Point for Provision"""
+    if profile_render:
+        profiler.enable()
+
     if collection_name:
         collection = ctx.obj.application.collection_by_name(collection_name)
         if not collection:
@@ -72,10 +55,15 @@ def plan(
     ctx: typer.Context,
     cleanup: bool = True,
     generate: bool = True,
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Only rewrite generated files whose content changed (use with --no-cleanup)",
+    ),
 ):
     """Generate an infrastructure plan"""
     send_event("provision.plan")
-    tf_config = ProvisionStageManager(ctx.obj.collection)
+    tf_config = ProvisionStageManager(ctx.obj.collection, incremental=incremental)
     is_setup = tf_config.make_ready_for_use(
         should_cleanup=cleanup,
         should_regenerate_config=generate,
@@ -104,10 +92,15 @@ def apply(
     cleanup: bool = True,
     generate: bool = True,
     update_environments: bool = False,
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Only rewrite generated files whose content changed (use with --no-cleanup)",
+    ),
 ):
     """Apply an infrastructure plan"""
     send_event("provision.apply")
-    tf_config = ProvisionStageManager(ctx.obj.collection)
+    tf_config = ProvisionStageManager(ctx.obj.collection, incremental=incremental)
     is_setup = tf_config.make_ready_for_use(
         should_cleanup=cleanup,
         should_regenerate_config=generate,
@@ -124,7 +117,7 @@ def apply(
         if update_environments:
             # Read environment.yml file into dict
             with open(ctx.obj.environments_file_path, "r") as file:
-                environments = ordered_load(file, yaml.SafeLoader)
+                environments = ordered_load(file)
 
             # Add to collection.data.infrastructure_outputs if any collections in environments yml dict have the "name" of ctx.obj.collection.name
             for collection in environments.get("collections", []):
@@ -137,7 +130,7 @@ def apply(
 
             # Write back to environments.yml
             with open(ctx.obj.environments_file_path, "w") as file:
-                ordered_dump(environments, file, yaml.SafeDumper)
+                ordered_dump(environments, file)
 
     except Exception as e:
         log.error(f"Cannot do TF apply for {tf_config}: {e}")
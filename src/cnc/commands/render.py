@@ -1,5 +1,16 @@
+import os
+import sys
+import time
+import shutil
+import tarfile
+from pathlib import Path
+from typing import List
+from contextlib import contextmanager, nullcontext
+
 import typer
+
 from cnc.models import ProvisionStageManager, DeployStageManager, BuildStageManager
+from cnc.models.render_profiler import profiler
 from .telemetry import send_event
 
 from cnc.logger import get_logger
@@ -8,27 +19,177 @@ log = get_logger(__name__)
 
 app = typer.Typer()
 
+STAGES = ["provision", "build", "deploy"]
+
+
+def render_provision(collection):
+    manager = ProvisionStageManager(collection)
+    if not manager.make_ready_for_use(init=False):
+        raise Exception(f"Cannot setup {manager}")
+    return manager
+
+
+def render_build(environment):
+    manager = BuildStageManager(environment)
+    manager.cleanup()
+    manager.setup()
+    manager.render_build()
+    return manager
+
+
+def render_deploy(environment):
+    manager = DeployStageManager(environment)
+    manager.cleanup()
+    manager.setup()
+    manager.render_scripts()
+    return manager
+
+
+def render_targets(application, stages=STAGES, collection_name=None):
+    """
+    Yields (stage, output prefix, render function, model) for everything
+    that should be rendered, collections first and then their environments
+    """
+    for collection in application.collections:
+        if collection_name and collection.name != collection_name:
+            continue
+
+        if "provision" in stages:
+            yield "provision", collection.name, render_provision, collection
+
+        for environment in collection.environments:
+            prefix = f"{collection.name}/{environment.name}"
+            if "build" in stages:
+                yield "build", prefix, render_build, environment
+            if "deploy" in stages:
+                yield "deploy", prefix, render_deploy, environment
+
+
+def render_all(application, write_output, stages=STAGES, collection_name=None):
+    """
+    Render every stage in one process (sharing the parsed application and
+    compiled templates). write_output(rendered_files_path, arcname) is called
+    for each rendered stage before its files are cleaned up.
+    Returns ({stage: {"count", "seconds"}}, [failed arcnames])
+    """
+    timings = {stage: {"count": 0, "seconds": 0.0} for stage in stages}
+    failed = []
+
+    for stage, prefix, render, model in render_targets(
+        application, stages=stages, collection_name=collection_name
+    ):
+        arcname = f"{prefix}/{stage}"
+        manager = None
+        start_time = time.perf_counter()
+        try:
+            manager = render(model)
+            timings[stage]["seconds"] += time.perf_counter() - start_time
+            timings[stage]["count"] += 1
+            write_output(manager.rendered_files_path, arcname)
+        except Exception as e:
+            log.error(f"Cannot render {arcname}: {e}")
+            failed.append(arcname)
+        finally:
+            if manager:
+                manager.cleanup()
+
+    return timings, failed
+
+
+@contextmanager
+def stdout_as_tar_stream():
+    """
+    Hands the real stdout to a tar stream and points fd 1 at stderr for
+    everything else (our logs and any subprocess output)
+    """
+    sys.stdout.flush()
+    tar_fd = os.dup(1)
+    saved_stdout_fd = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        with os.fdopen(tar_fd, "wb") as stream:
+            with tarfile.open(fileobj=stream, mode="w|") as tar:
+                yield tar
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_stdout_fd, 1)
+        os.close(saved_stdout_fd)
+
 
 @app.callback(invoke_without_command=True)
 @app.command()
 def render(
     ctx: typer.Context,
-    stage: str = "provision",
-    extra_context: dict = None,
+    output_dir: Path = typer.Option(
+        None,
+        "--output-dir",
+        "-o",
+        help="Directory to write rendered files to (default: tar stream on stdout)",
+    ),
+    stages: List[str] = typer.Option(
+        STAGES,
+        "--stage",
+        "-s",
+        help="Stage(s) to render: provision, build and/or deploy",
+    ),
+    collection_name: str = typer.Option(
+        None, "--collection-name", help="Only render this collection"
+    ),
+    profile_render: bool = typer.Option(
+        False,
+        "--profile-render",
+        help="Profile template rendering and print a summary at the end",
+    ),
 ):
-    send_event("render.render")
+    """Render templates for all collections, environments and stages"""
+    if profile_render:
+        profiler.enable()
+
+    output = nullcontext() if output_dir else stdout_as_tar_stream()
+    with output as tar:
+        send_event("render.render")
+
+        unknown_stages = [stage for stage in stages if stage not in STAGES]
+        if unknown_stages:
+            log.error(f"No manager for {unknown_stages} (stages are: {STAGES})")
+            raise typer.Exit(code=1)
 
-    manager_map = {
-        "build": BuildStageManager,
-        "provision": ProvisionStageManager,
-        "deploy": DeployStageManager,
-    }
+        def write_output(rendered_files_path, arcname):
+            if tar:
+                tar.add(rendered_files_path, arcname=arcname)
+            else:
+                shutil.copytree(
+                    rendered_files_path, output_dir / arcname, dirs_exist_ok=True
+                )
 
-    if not manager_map.get("stage"):
-        log.error(f"No manager for {stage}")
-        raise typer.Exit(code=1)
+        timings, failed = render_all(
+            ctx.obj.application,
+            write_output,
+            stages=stages,
+            collection_name=collection_name,
+        )
+        print_timings(timings)
+        profiler.report()
 
-    # get manager
-    # render template with added context
+        if failed:
+            log.error(f"Rendering failed for: {', '.join(failed)}")
+            raise typer.Exit(code=1)
 
     raise typer.Exit()
+
+
+def print_timings(timings):
+    from tabulate import tabulate
+
+    table_data = [
+        [stage, timing["count"], f"{timing['seconds']:.2f}"]
+        for stage, timing in timings.items()
+    ]
+    table_data.append(
+        [
+            "total",
+            sum(timing["count"] for timing in timings.values()),
+            f"{sum(timing['seconds'] for timing in timings.values()):.2f}",
+        ]
+    )
+    print(tabulate(table_data, ["stage", "rendered", "seconds"], tablefmt="grid"))
@@ -1,5 +1,4 @@
 import typer
-from IPython import embed
 from cnc.models import (
     # Environment,
     # EnvironmentVariable,
@@ -23,6 +22,8 @@ def get_app():
 @app.callback(invoke_without_command=True)
 @app.command()
 def start(ctx: typer.Context):
+    from IPython import embed
+
     send_event("shell.start")
     local_vars = {
         "get_app": get_app,
@@ -1,12 +1,6 @@
 import os
 
-import rudderstack.analytics as rudder_analytics
-import machineid
-
-rudder_analytics.write_key = "2eEyoetBjPLeYUOg8jRfOicBRiS"
-rudder_analytics.dataPlaneUrl = "https://withcoherepvm.dataplane.rudderstack.com"
-rudder_analytics.debug = True
-rudder_analytics.gzip = True
+_rudder_analytics = None
 
 # default to enabling telemetry for now
 TELEMETRY_ENABLED = (
@@ -18,11 +12,31 @@ TELEMETRY_ENABLED = (
 CURRENT_COMMAND = ""
 
 
+def get_rudder_analytics():
+    # only imported when telemetry is actually sent
+    global _rudder_analytics
+
+    if _rudder_analytics is None:
+        import rudderstack.analytics as rudder_analytics
+
+        rudder_analytics.write_key = "2eEyoetBjPLeYUOg8jRfOicBRiS"
+        rudder_analytics.dataPlaneUrl = (
+            "https://withcoherepvm.dataplane.rudderstack.com"
+        )
+        rudder_analytics.debug = True
+        rudder_analytics.gzip = True
+        _rudder_analytics = rudder_analytics
+
+    return _rudder_analytics
+
+
 def send_event(command_name: str):
     command_data = {
         "name": command_name,
     }
     if TELEMETRY_ENABLED:
+        import machineid
+
         try:
             _id = machineid.id()
         except Exception as e:
@@ -32,6 +46,6 @@ def send_event(command_name: str):
         try:
             user_id = os.environ.get("CNC_USER_ID", _id or "UNKNOWN")
             print(f"Sending {command_data} to RS for {user_id}")
-            rudder_analytics.track(user_id, "command", command_data)
+            get_rudder_analytics().track(user_id, "command", command_data)
         except Exception as e:
             print(f"Cannot send telemetry event: {e}")
@@ -4,15 +4,9 @@ import click
 import pprint
 from jinja2.visitor import NodeVisitor
 
-from jinja2 import (
-    meta,
-    Environment,
-    FileSystemLoader,
-    select_autoescape,
-    StrictUndefined,
-)
+from jinja2 import meta
 
-from cnc.models.cycle_stage_base import _TemplatedBase
+from cnc.models.cycle_stage_base import _TemplatedBase, get_template_environment
 
 from cnc.logger import get_logger
 
@@ -75,11 +69,7 @@ class TemplateInspector(_TemplatedBase):
         self.template_type = template_type
 
     def get_parsed_template(self, template_name):
-        env = Environment(
-            loader=FileSystemLoader(self.config_files_path),
-            autoescape=select_autoescape(),
-            undefined=StrictUndefined,
-        )
+        env = get_template_environment(self.template_search_path)
         template_source = env.loader.get_source(env, template_name)[0]
         return env.parse(template_source)
 
@@ -150,7 +140,6 @@ class TemplateInspector(_TemplatedBase):
         return _context
 
     def inspect(self, template_name):
-        self.copy_template_dir()
         self.debug_template_directory()
 
         ast = self.get_parsed_template(template_name)
@@ -5,6 +5,7 @@ from typing_extensions import Annotated
 
 from cnc.models import DeployStageManager
 from cnc.models import BuildStageManager
+from cnc.models.render_profiler import profiler
 from .telemetry import send_event
 
 from cnc.logger import get_logger
@@ -35,7 +36,26 @@ def perform(
     cleanup: bool = True,
     debug: bool = False,
     generate: bool = True,
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Only rewrite generated files whose content changed (use with --no-cleanup)",
+    ),
+    render_workers: int = typer.Option(
+        1,
+        "--render-workers",
+        envvar="CNC_RENDER_WORKERS",
+        help="Number of services to render scripts for concurrently",
+    ),
+    profile_render: bool = typer.Option(
+        False,
+        "--profile-render",
+        help="Profile template rendering and print a summary at the end",
+    ),
 ):
+    if profile_render:
+        profiler.enable()
+
     start_time = time.time()
     send_event("update.perform")
     collection = ctx.obj.application.collection_by_name(collection_name)
@@ -52,6 +72,8 @@ def perform(
         environment,
         service_tags=service_tags,
         default_tag=default_tag,
+        incremental=incremental,
+        render_workers=render_workers,
     )
     _ret = builder.perform(
         should_cleanup=cleanup,
@@ -64,6 +86,8 @@ def perform(
             environment,
             service_tags=service_tags,
             default_tag=default_tag,
+            incremental=incremental,
+            render_workers=render_workers,
         )
         deployer.perform(
             should_cleanup=cleanup,
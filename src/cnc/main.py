@@ -8,7 +8,7 @@ from typing_extensions import Annotated
 import typer
 from rich import print
 
-from .commands import provision, build, deploy, info, shell, toolbox, update
+from .commands import provision, build, deploy, info, render, shell, toolbox, update
 from .commands.template_editor import inspector
 from .commands.telemetry import send_event
 from .models import Application
@@ -23,10 +23,14 @@ app.add_typer(build.app, name="build")
 app.add_typer(deploy.app, name="deploy")
 app.add_typer(inspector.app, name="inspector")
 app.add_typer(info.app, name="info")
+app.add_typer(render.app, name="render")
 app.add_typer(shell.app, name="shell")
 app.add_typer(toolbox.app, name="toolbox")
 app.add_typer(update.app, name="update")
 
+# commands that target a single environment only validate that environment
+LAZY_COMMANDS = ["build", "deploy", "toolbox", "update"]
+
 
 @dataclass
 class Common:
@@ -75,6 +79,7 @@ def add_common(
     application = Application.from_environments_yml(
         environments_file_path,
         config_file_path,
+        lazy=ctx.invoked_subcommand in LAZY_COMMANDS,
     )
     if not application:
         log.error(f"No application for: {environments_file_path}")
@@ -1,17 +1,20 @@
-import yaml
 import os
 from pathlib import Path
 from typing import Union, List, ClassVar, Optional
+from typing_extensions import Annotated
 from pydantic import (
     Field,
     model_validator,
     field_validator,
+    ValidationInfo,
 )
 
 from .base_model import BaseModel
+from .snapshot import snapshot_cache_dir, snapshot_path, load_snapshot, save_snapshot
 from .providers.amazon.environment_collection import AWSEnvironmentCollection
 from .providers.google.environment_collection import GCPEnvironmentCollection
 from cnc.utils import clean_name_string
+from cnc.utils.yaml_io import safe_load
 
 from cnc.logger import get_logger
 
@@ -51,14 +54,24 @@ class Application(BaseModel):
     region: Optional[str] = None
     flavor: str
     version: Union[int, float]
-    collections: List[Union[AWSEnvironmentCollection, GCPEnvironmentCollection]] = (
-        Field(discriminator="provider")
-    )
+    # the discriminator has to be on the union (not the list) for pydantic
+    # to use it, otherwise each collection is validated as both types
+    collections: List[
+        Annotated[
+            Union[AWSEnvironmentCollection, GCPEnvironmentCollection],
+            Field(discriminator="provider"),
+        ]
+    ]
     template_config: Optional[TemplateConfig] = Field(default_factory=TemplateConfig)
 
     GCP_APP_PROVIDER: ClassVar[str] = "gcp"
     AWS_APP_PROVIDER: ClassVar[str] = "aws"
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "_envs",
+        "_flavor_metadata",
+    ]
+
     # ------------------------------
     # Validators
     # ------------------------------
@@ -71,70 +84,90 @@ class Application(BaseModel):
 
     @model_validator(mode="after")
     def annotate_children(self):
-        for collection in self.collections:
-            collection.application = self
-
-            for environment in collection.environments:
-                environment.application = self
-
-        return self
+        return self.link_children()
 
     @field_validator("name", mode="before")
     def validate_name(cls, value: str) -> str:
         return clean_name_string(value)
 
     @model_validator(mode="after")
-    def validate_no_duplicate_url_path(self):
-        for collection in self.collections:
-            if collection.has_service_domains:
-                continue
+    def validate_environments(self, info: ValidationInfo):
+        # lazily loaded environments are validated when their config is loaded
+        if (info.context or {}).get("lazy"):
+            return self
 
-            for environment in collection.environments:
-                url_paths = []
-                for service in environment.services:
-                    if service.settings.is_web:
-                        if service.settings.url_path in url_paths:
-                            raise ValueError(
-                                "Duplicate URL path for environment "
-                                f"{environment.name} in collection {collection.name}: "
-                                f"{service.settings.url_path}. "
-                                "URL paths must be unique per service."
-                            )
-
-                        url_paths.append(service.settings.url_path)
+        for environment in self.environments:
+            # loads the AppConfig, then runs validate_environment
+            environment.config
 
         return self
 
-    @model_validator(mode="after")
-    def validate_service_types(self):
-        for collection in self.collections:
-            allowed_service_types = SUPPORTED_SERVICES_FOR_FLAVOR.get(self.flavor, [])
-
-            for environment in collection.environments:
-                for service in environment.services:
-                    if service.settings.type not in allowed_service_types:
-                        raise ValueError(
-                            f"Unsupported service type {service.settings.type} for flavor {self.environment.collection.application.flavor}"
-                        )
-        return self
+    def validate_environment(self, environment):
+        self.validate_no_duplicate_url_path(environment)
+        self.validate_service_types(environment)
+        # raises on alias cycles
+        environment.alias_resolver
+
+    def validate_no_duplicate_url_path(self, environment):
+        if environment.collection.has_service_domains:
+            return
+
+        url_paths = []
+        for service in environment.services:
+            if service.settings.is_web:
+                if service.settings.url_path in url_paths:
+                    raise ValueError(
+                        "Duplicate URL path for environment "
+                        f"{environment.name} in collection {environment.collection.name}: "
+                        f"{service.settings.url_path}. "
+                        "URL paths must be unique per service."
+                    )
+
+                url_paths.append(service.settings.url_path)
+
+    def validate_service_types(self, environment):
+        allowed_service_types = SUPPORTED_SERVICES_FOR_FLAVOR.get(self.flavor, [])
+
+        for service in environment.services:
+            if service.settings.type not in allowed_service_types:
+                raise ValueError(
+                    f"Unsupported service type {service.settings.type} for flavor {self.flavor}"
+                )
 
     # ------------------------------
     # Class methods
     # ------------------------------
     @classmethod
     def from_environments_yml(
-        cls, data_file_path: Path, config_file_path: Path = "cnc.yml"
+        cls, data_file_path: Path, config_file_path: Path = "cnc.yml", lazy=False
     ):
+        """
+        With lazy=True each environment's AppConfig is only validated
+        when it is first used (for commands that target one environment)
+        """
+        cache_dir = snapshot_cache_dir()
+        if cache_dir:
+            path = snapshot_path(cache_dir, data_file_path, config_file_path, lazy)
+            application = load_snapshot(path, cls)
+            if application:
+                return application
+
         with open(data_file_path) as parsed_data:
-            env_yml_data = yaml.safe_load(parsed_data)
-        return cls.model_validate(
+            env_yml_data = safe_load(parsed_data)
+        application = cls.model_validate(
             env_yml_data,
             context={
                 "config_file_path": str(config_file_path),
                 "provider": env_yml_data.get("provider"),
+                "lazy": lazy,
             },
         )
 
+        if cache_dir:
+            save_snapshot(path, application)
+
+        return application
+
     @classmethod
     def from_environments_data(cls, data):
         return cls.model_validate(
@@ -188,11 +221,22 @@ class Application(BaseModel):
 
         return self._envs
 
+    @property
+    def shared_configs(self):
+        # validated AppConfigs by Environment.config_fingerprint
+        if not hasattr(self, "_shared_configs"):
+            self._shared_configs = {}
+
+        return self._shared_configs
+
     @property
     def flavor_metadata(self):
         # load the .metadata file from the top level of the flavor directory
-        with open(self.metadata_file) as metadata_file:
-            return yaml.safe_load(metadata_file.read())
+        if not hasattr(self, "_flavor_metadata"):
+            with open(self.metadata_file) as metadata_file:
+                self._flavor_metadata = safe_load(metadata_file.read())
+
+        return self._flavor_metadata
 
     @property
     def metadata_file(self):
@@ -224,10 +268,54 @@ class Application(BaseModel):
 
     __str__ = __repr__
 
+    def link_children(self):
+        """
+        Sets the parent references of every collection, environment and
+        variable in one pass (each AppConfig links its own services when
+        it's loaded, see AppConfig.link_children)
+        """
+        for collection in self.collections:
+            collection.application = self
+
+            if collection.database_password:
+                collection.database_password.collection = collection
+
+            for environment in collection.environments:
+                environment.application = self
+                environment.collection = collection
+
+                for variable in environment.environment_variables:
+                    variable.environment = environment
+                    variable.collection = collection
+
+                if environment.database_password:
+                    environment.database_password.environment = environment
+                    environment.database_password.collection = collection
+
+        return self
+
+    def invalidate_caches(self):
+        """
+        Drops cached names, ids and indexes on every model in the
+        application, call after changing the model graph in place
+        """
+        super().invalidate_caches()
+        for collection in self.collections:
+            collection.invalidate_caches()
+
+            for environment in collection.environments:
+                environment.invalidate_caches()
+
+                for variable in environment.environment_variables:
+                    variable.invalidate_caches()
+
+                if environment.config_loaded:
+                    for service in environment.services:
+                        service.invalidate_caches()
+                        service.settings.invalidate_caches()
+
     def collection_by_name(self, collection_name=None):
         if collection_name:
-            for collection in self.collections:
-                if collection.name == collection_name:
-                    return collection
+            return self.name_index("collections").get(self.collections, collection_name)
         else:
             return self.default_collection
@@ -1,3 +1,5 @@
+from typing import ClassVar, List
+
 from pydantic import (
     BaseModel as PydanticBaseModel,
     model_validator,
@@ -14,6 +16,9 @@ class IgnoredType:
 
 
 class BaseModel(PydanticBaseModel):
+    # instance attributes dropped by invalidate_caches
+    cached_attributes: ClassVar[List[str]] = ["_name_indexes"]
+
     @model_validator(mode="before")
     @classmethod
     def ensure_provider(cls, data: dict, info: ValidationInfo):
@@ -35,6 +40,56 @@ class BaseModel(PydanticBaseModel):
 
         return with_names
 
+    def name_index(self, key):
+        """NameIndex stored on the instance, dropped by invalidate_caches"""
+        indexes = self.__dict__.setdefault("_name_indexes", {})
+        index = indexes.get(key)
+        if index is None:
+            index = indexes.setdefault(key, NameIndex())
+
+        return index
+
+    def invalidate_caches(self):
+        """Call after changing the model graph in place"""
+        for name in self.cached_attributes:
+            self.__dict__.pop(name, None)
+
     class Config:
         ignored_types = (IgnoredType,)
         arbitrary_types_allowed = True
+
+
+class NameIndex:
+    """
+    Items of a list by name (the first one wins, like a linear scan).
+    Rebuilt when a different list is passed or the list changes length,
+    items replaced in place need invalidate_caches. The index is swapped in
+    as one (items, length, index) tuple, so concurrent renders never see
+    a half-updated one.
+    """
+
+    def __init__(self):
+        self.state = (None, None, {})
+
+    def get(self, items, name):
+        indexed_items, length, index = self.state
+        if items is not indexed_items or len(items) != length:
+            index = {}
+            for item in items:
+                index.setdefault(item.name, item)
+
+            self.state = (items, len(items), index)
+
+        return index.get(name)
+
+
+def bound_copy(model, **parents):
+    """
+    Shallow copy of a model that shares its (parsed) field values but points
+    at new parents. Anything cached on the instance is left behind.
+    """
+    copy = model.model_copy(update=parents)
+    for key in set(copy.__dict__) - set(model.model_fields):
+        del copy.__dict__[key]
+
+    return copy
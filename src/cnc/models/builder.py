@@ -47,31 +47,31 @@ class BuildStageManager(EnvironmentTemplatedBase):
         return
 
     def render_build(self, service_names=None):
-        for service in self.environment.services:
-            if service_names:
-                if service.name not in service_names:
-                    continue
-
-            if service.settings.is_resource:
-                continue
+        services = self.services_to_render(service_names)
+        self.scripts_to_run.extend(
+            self.render_services(self.render_service_build, services)
+        )
+        self.finish_render()
 
-            context = self.template_context(service)
-            context["render_template"] = self.write_template_with_context(service)
+    def render_service_build(self, service):
+        context = self.template_context(service)
+        context["render_template"] = self.write_template_with_context(service)
 
-            self.write_template(
-                "build_functions.sh.j2",
-                output_name=f"build-{service.name}-functions.sh",
-                context=context,
-            )
+        self.write_template(
+            "build_functions.sh.j2",
+            output_name=f"build-{service.name}-functions.sh",
+            context=context,
+        )
 
-            service_build_script_name = f"build-{service.name}.sh"
-            self.write_template(
-                "main.sh.j2", output_name=service_build_script_name, context=context
-            )
-            self.scripts_to_run.append(service_build_script_name)
+        service_build_script_name = f"build-{service.name}.sh"
+        self.write_template(
+            "main.sh.j2", output_name=service_build_script_name, context=context
+        )
+        return service_build_script_name
 
     def perform(self, should_cleanup=True, should_regenerate_config=True, debug=False):
         log.debug(f"Performing build for {self} @ {self.config_files_path}")
+        self.check_incremental(should_cleanup)
         if should_cleanup:
             self.cleanup()
 
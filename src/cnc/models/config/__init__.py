@@ -1 +1 @@
-from .config import AppConfig, InternalSettings
+from .config import AppConfig, InternalSettings, ManagedEnvironmentItems
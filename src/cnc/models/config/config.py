@@ -1,4 +1,3 @@
-import re
 import hashlib
 from typing import List, Optional, Union, Any
 
@@ -8,6 +7,7 @@ from cnc.constants import EnvironmentVariableTypes
 
 # from cnc.constants import EnvironmentVariableDestinations
 from ..environment_variable import EnvironmentVariable
+from ..base_model import bound_copy
 from .resource import (
     DynamoDBResourceSettings,
     CacheResourceSettings,
@@ -64,6 +64,101 @@ class InternalSettings(BaseModel):
         return formatted_resource_svcs
 
 
+class ManagedEnvironmentItems:
+    """
+    Managed variables & secrets of an environment (see
+    Environment.managed_items). Every service's settings are read once,
+    the merged items for a service are built on first use and
+    EnvironmentVariables are shared between services.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        environment = config.environment
+        self.base_variables = {
+            "CNC_APPLICATION_NAME": environment.application.name,
+            "CNC_ENVIRONMENT_NAME": environment.name,
+            "CNC_ENVIRONMENT_DOMAIN": (
+                environment.domains[0]["domain"] if environment.domains else ""
+            ),
+            "CNC_ENVIRONMENT_CUSTOM_DOMAIN": (
+                environment.custom_domains[0] if environment.custom_domains else ""
+            ),
+            "CNC_ENVIRONMENT_REGION": environment.collection.region,
+        }
+        self.service_variables = [
+            (service, service.settings.managed_environment_variables)
+            for service in config.services
+        ]
+        self.resource_secrets = [
+            (resource, resource.settings.managed_environment_secrets)
+            for resource in config.resources
+        ]
+        self._variables = {}
+        self._secrets = {}
+        self._variable_objects = {}
+
+    @staticmethod
+    def merged(items_by_service, service, base=None):
+        # the service's own items go last so they win (compared with ==
+        # like the sort this replaces, so an equal copy counts as its own)
+        merged = dict(base or {})
+        for other_service, items in items_by_service:
+            if not other_service == service:
+                merged.update(items)
+        for other_service, items in items_by_service:
+            if other_service == service:
+                merged.update(items)
+
+        return merged
+
+    # setdefault: services rendered concurrently share the first one built
+    def variable_object(self, name, **data):
+        key = (name, tuple(data.items()))
+        variable = self._variable_objects.get(key)
+        if variable is None:
+            variable = self._variable_objects.setdefault(
+                key, self.config.variable_object({"name": name, **data})
+            )
+
+        return variable
+
+    @staticmethod
+    def cached_for(cache, service, build):
+        """
+        Items built for service, keyed by id as models aren't hashable.
+        Entries hold on to their service, so while one is cached its id
+        can't be reused by another service.
+        """
+        entry = cache.get(id(service))
+        if entry is None:
+            # setdefault: services rendered concurrently share the first one
+            entry = cache.setdefault(id(service), (service, build()))
+
+        return list(entry[1])
+
+    def variables_for(self, service=None):
+        def build():
+            merged = self.merged(self.service_variables, service, self.base_variables)
+            return [
+                self.variable_object(name, value=value)
+                for name, value in merged.items()
+                if value
+            ]
+
+        return self.cached_for(self._variables, service, build)
+
+    def secrets_for(self, service=None):
+        def build():
+            merged = self.merged(self.resource_secrets, service)
+            return [
+                self.variable_object(name, secret_id=secret_id)
+                for name, secret_id in merged.items()
+            ]
+
+        return self.cached_for(self._secrets, service, build)
+
+
 class AppConfig(BaseModel):
     settings: Optional[InternalSettings] = Field(
         default_factory=InternalSettings, alias="x-cnc"
@@ -99,12 +194,41 @@ class AppConfig(BaseModel):
 
     @model_validator(mode="after")
     def annotate_children(self):
+        return self.link_children()
+
+    def link_children(self):
+        """
+        Sets the parent references of every service, its settings and
+        workers in one pass
+        """
         for service in self.services + self.settings.explicit_resources:
             service.config = self
+            service.environment = self.environment
             service.settings.config = self
+            service.settings.service = service
+
+            for worker in getattr(service.settings, "workers", None) or []:
+                worker.settings = service.settings
 
         return self
 
+    def copy_for(self, environment):
+        """
+        This config for another environment with identical config_data:
+        services & settings are re-bound to environment, everything
+        parsed below them is shared
+        """
+        config = bound_copy(self, environment=environment)
+        config.services = [service.copy_for() for service in self.services]
+        config.settings = bound_copy(
+            self.settings,
+            explicit_resources=[
+                resource.copy_for() for resource in self.settings.explicit_resources
+            ],
+        )
+
+        return config.link_children()
+
     @property
     def resources(self):
         all_resources = []
@@ -143,49 +267,9 @@ class AppConfig(BaseModel):
                 f"Invalid variable type in filtered_environment_items: {variable_type}"
             )
 
-        regex_vars_by_name = []
-        for item in self.environment.environment_variables:
-            if pattern:
-                if re.match(pattern, item.name):
-                    regex_vars_by_name.append(item)
-            else:
-                regex_vars_by_name.append(item)
-
-        service_vars = []
-        for env_item in regex_vars_by_name:
-            if not service_name:
-                service_vars.append(env_item)
-            elif (not env_item.service) or (env_item.service == service_name):
-                service_vars.append(env_item)
-
-        type_vars = []
-        if variable_type:
-            for item in service_vars:
-                if variable_type == item.variable_type:
-                    type_vars.append(item)
-                elif (
-                    variable_type == EnvironmentVariableTypes.VARIABLE_TYPE_SECRET
-                    and item.alias
-                    and item.secret_id
-                ):
-                    type_vars.append(item)
-                elif (
-                    variable_type == EnvironmentVariableTypes.VARIABLE_TYPE_OUTPUT
-                    and item.alias
-                    and item.output_name
-                ):
-                    type_vars.append(item)
-                elif (
-                    variable_type == EnvironmentVariableTypes.VARIABLE_TYPE_STANDARD
-                    and item.alias
-                    and not item.output_name
-                    and not item.secret_id
-                ):
-                    type_vars.append(item)
-        else:
-            type_vars = service_vars
-
-        return type_vars
+        return self.environment.variable_index.filter(
+            service_name=service_name, variable_type=variable_type, pattern=pattern
+        )
 
     @property
     def reserved_environment_item_names(self):
@@ -207,43 +291,10 @@ class AppConfig(BaseModel):
         return self.managed_environment_secrets_for_service()
 
     def managed_environment_variables_for_service(self, service=None):
-        _vars = {
-            "CNC_APPLICATION_NAME": self.environment.application.name,
-            "CNC_ENVIRONMENT_NAME": self.environment.name,
-            "CNC_ENVIRONMENT_DOMAIN": (
-                self.environment.domains[0]["domain"]
-                if self.environment.domains
-                else ""
-            ),
-            "CNC_ENVIRONMENT_CUSTOM_DOMAIN": (
-                self.environment.custom_domains[0]
-                if self.environment.custom_domains
-                else ""
-            ),
-            "CNC_ENVIRONMENT_REGION": self.environment.collection.region,
-        }
-
-        sorted_services = sorted(self.services, key=lambda s: s == service)
-        for service in sorted_services:
-            _vars.update(service.settings.managed_environment_variables)
-
-        variable_objects = []
-        for k, v in _vars.items():
-            if v:
-                variable_objects.append(self.variable_object({"name": k, "value": v}))
-
-        return variable_objects
+        return self.environment.managed_items.variables_for(service)
 
     def managed_environment_secrets_for_service(self, service=None):
-        _vars = {}
-
-        sorted_resources = sorted(self.resources, key=lambda s: s == service)
-        for resource in sorted_resources:
-            _vars.update(resource.settings.managed_environment_secrets)
-
-        return [
-            self.variable_object({"name": k, "secret_id": v}) for k, v in _vars.items()
-        ]
+        return self.environment.managed_items.secrets_for(service)
 
     @property
     def database_resources(self):
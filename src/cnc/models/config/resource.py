@@ -3,7 +3,7 @@ import hashlib
 import re
 import urllib
 import secrets
-from typing import List, Optional, Literal, Union
+from typing import ClassVar, List, Optional, Literal, Union
 from pydantic import Field
 
 from ..base_model import BaseModel, IgnoredType
@@ -36,6 +36,10 @@ class BaseResourceSettings(BaseModel):
     config: Optional[IgnoredType] = IgnoredType()
     service: Optional[IgnoredType] = IgnoredType()
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "_unique_id"
+    ]
+
     # ------------------------------
     # Properties
     # ------------------------------
@@ -97,14 +101,17 @@ class BaseResourceSettings(BaseModel):
 
     @property
     def unique_id(self):
-        hash_str = (
-            f"{self.config.environment.application.name}:"
-            f"{self.config.environment.collection.name}:"
-            f"{self.service.name}:{self.engine}"
-        )
-        _hash = hashlib.sha256()
-        _hash.update(hash_str.encode())
-        return _hash.hexdigest()
+        if not hasattr(self, "_unique_id"):
+            hash_str = (
+                f"{self.config.environment.application.name}:"
+                f"{self.config.environment.collection.name}:"
+                f"{self.service.name}:{self.engine}"
+            )
+            _hash = hashlib.sha256()
+            _hash.update(hash_str.encode())
+            self._unique_id = _hash.hexdigest()
+
+        return self._unique_id
 
     @property
     def common_managed_environment_variables(self):
@@ -1,6 +1,8 @@
 import re
 import string
+from functools import cached_property
 from typing import (
+    ClassVar,
     List,
     Optional,
     Dict,
@@ -14,11 +16,12 @@ from pydantic import (
     model_validator,
     ValidationInfo,
 )
-from jinja2 import Template
 
 from cnc.constants import EnvironmentVariableTypes
 from cnc.utils import clean_name_string
-from ..base_model import BaseModel, IgnoredType
+from cnc.utils.render import inline_template
+from ..base_model import BaseModel, IgnoredType, bound_copy
+from ..render_profiler import profiler
 from .resource import (
     BucketResourceSettings,
     DynamoDBResourceSettings,
@@ -134,6 +137,11 @@ class Service(BaseModel):
         alias="env_parent_rel",
     )
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "instance_name",
+        "_insecure_environment_items",
+    ]
+
     # ------------------------------
     # Validators
     # ------------------------------
@@ -188,11 +196,19 @@ class Service(BaseModel):
 
         return data
 
-    @model_validator(mode="after")
-    def annotate_children(self):
-        self.settings.service = self
+    def copy_for(self):
+        """
+        This service for another environment's (identical) config,
+        parent links are set by AppConfig.link_children
+        """
+        service = bound_copy(self)
+        service.settings = bound_copy(self.settings)
+        if getattr(self.settings, "workers", None):
+            service.settings.workers = [
+                bound_copy(worker) for worker in self.settings.workers
+            ]
 
-        return self
+        return service
 
     @field_validator("command", mode="before")
     def validate_command(cls, value: Any) -> list[str]:
@@ -239,7 +255,7 @@ class Service(BaseModel):
     def max_scale(self):
         return self.settings.system.platform_settings.max_scale
 
-    @property
+    @cached_property
     def instance_name(self):
         if (
             hasattr(self.settings, "existing_instance_name")
@@ -374,15 +390,26 @@ class Service(BaseModel):
     def insecure_environment_items(self):
         # this does not include secrets, meant for deploy runtime config
         # e.g. ECS/cloud run, includes standard/outputs
-        _insecure_items = []
-        _insecure_items.extend(self.environment_outputs)
-        for item in self.environment_variables:
-            if item.alias and item.secret_id:
-                continue
+        # memoized for a stage manager run (see reset_render_memos), partials
+        # like ecs_web_task.json.j2 look it up once per worker/task
+        hit = hasattr(self, "_insecure_environment_items")
+        profiler.count_cache("Service.insecure_environment_items", hit)
+        if not hit:
+            _insecure_items = []
+            _insecure_items.extend(self.environment_outputs)
+            for item in self.environment_variables:
+                if item.alias and item.secret_id:
+                    continue
+
+                _insecure_items.append(item)
+
+            self._insecure_environment_items = _insecure_items
 
-            _insecure_items.append(item)
+        return self._insecure_environment_items
 
-        return _insecure_items
+    def reset_render_memos(self):
+        """Drop values memoized while rendering, called by each stage run"""
+        self.__dict__.pop("_insecure_environment_items", None)
 
     @property
     def gcr_image_name(self):
@@ -415,7 +442,9 @@ class Service(BaseModel):
         context = {"service": self}
         _links = [
             {
-                "url": Template(_templates.get(self.settings.type, "")).render(context),
+                "url": inline_template(_templates.get(self.settings.type, "")).render(
+                    context
+                ),
                 "label": self.settings.type,
             }
         ]
@@ -429,7 +458,9 @@ class Service(BaseModel):
             )
             _links.append(
                 {
-                    "url": Template(_templates.get("worker", "")).render(_context),
+                    "url": inline_template(_templates.get("worker", "")).render(
+                        _context
+                    ),
                     "label": worker.name,
                     "type": "worker",
                 }
@@ -444,7 +475,7 @@ class Service(BaseModel):
             )
             _links.append(
                 {
-                    "url": Template(_templates.get("task", "")).render(_context),
+                    "url": inline_template(_templates.get("task", "")).render(_context),
                     "label": task.name,
                     "type": "task",
                 }
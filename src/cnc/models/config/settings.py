@@ -1,6 +1,7 @@
 import re
 import hashlib
 from typing import (
+    ClassVar,
     List,
     Optional,
     Any,
@@ -102,6 +103,10 @@ class BaseServiceSettings(BaseModel):
     config: Optional[IgnoredType] = IgnoredType()
     service: Optional[IgnoredType] = IgnoredType()
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "_unique_id"
+    ]
+
     # ------------------------------
     # Validators
     # ------------------------------
@@ -143,11 +148,14 @@ class BaseServiceSettings(BaseModel):
 
     @property
     def unique_id(self):
-        _hash = hashlib.sha256()
-        _hash.update(
-            f"{self.service.environment.application.name}:{self.service.environment.collection.name}:{self.service.environment.name}:{self.service.name}:{self.url_path}:{self.system.health_check}".encode()
-        )
-        return _hash.hexdigest()
+        if not hasattr(self, "_unique_id"):
+            _hash = hashlib.sha256()
+            _hash.update(
+                f"{self.service.environment.application.name}:{self.service.environment.collection.name}:{self.service.environment.name}:{self.service.name}:{self.url_path}:{self.system.health_check}".encode()
+            )
+            self._unique_id = _hash.hexdigest()
+
+        return self._unique_id
 
     @property
     def managed_environment_variables(self):
@@ -367,13 +375,6 @@ class BackendServiceSettings(BaseServiceSettings):
     # ------------------------------
     # Validators
     # ------------------------------
-    @model_validator(mode="after")
-    def annotate_children(self):
-        for worker in self.workers:
-            worker.settings = self
-
-        return self
-
     @field_validator("seed", mode="before")
     def validate_seed(cls, value: Any) -> list[str]:
         return validate_command_list(value)
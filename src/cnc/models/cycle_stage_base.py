@@ -1,27 +1,119 @@
 import os
-import re
+import json
 import subprocess
 import shutil
+import zipfile
 from pathlib import Path
 from functools import partial, cached_property
 import shlex
 from datetime import datetime
+import concurrent.futures
 
+import jinja2
 from jinja2 import (
     Environment,
     FileSystemLoader,
+    FileSystemBytecodeCache,
     select_autoescape,
     StrictUndefined,
 )
+from jinja2.bccache import Bucket
 
+from cnc.utils.cache import cache_directory, env_flag, is_private
+from cnc.utils.files import AtomicWriter, atomic_write
+from cnc.utils.render import collapse_blank_lines
+from .render_profiler import profiler
+from .template_context import LazyTemplateContext, referenced_names
 from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
+# one jinja environment per template search path for the whole process,
+# so each template is only compiled once no matter how many services,
+# workers or scheduled tasks render it
+_template_environments = {}
+_template_bytecode_cache = None
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    Keys compiled templates by name, source checksum and jinja version
+    rather than by file path, so the same flavor template is only compiled
+    once across cnc invocations (and across collection config directories).
+    Writes are atomic (see FileSystemBytecodeCache.dump_bytecode) so the
+    cache directory can be shared by concurrent processes.
+    """
+
+    def get_bucket(self, environment, name, filename, source):
+        checksum = self.get_source_checksum(source)
+        key = self.get_cache_key(f"{jinja2.__version__}:{name}:{checksum}")
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        return bucket
+
+
+def get_template_bytecode_cache():
+    """
+    Opt-in with CNC_TEMPLATE_CACHE=1 (uses ~/.cache/cnc/jinja)
+    or by pointing CNC_TEMPLATE_CACHE_DIR at a directory. The cached
+    bytecode is executed, so the directory has to be private.
+    """
+    global _template_bytecode_cache
+
+    cache_dir = os.environ.get("CNC_TEMPLATE_CACHE_DIR")
+    if not (cache_dir or env_flag("CNC_TEMPLATE_CACHE")):
+        return None
+
+    cache_dir = cache_dir or cache_directory("jinja")
+    if (
+        _template_bytecode_cache is None
+        or _template_bytecode_cache.directory != cache_dir
+    ):
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            if not is_private(cache_dir):
+                log.warning(
+                    f"Ignoring template cache dir {cache_dir} not owned by the "
+                    "current user or writable by other users"
+                )
+                return None
+        except OSError as e:
+            log.warning(f"Cannot use template cache dir {cache_dir}: {e}")
+            return None
+
+        _template_bytecode_cache = TemplateBytecodeCache(cache_dir)
+
+    return _template_bytecode_cache
+
+
+def get_template_environment(search_path):
+    if isinstance(search_path, (str, os.PathLike)):
+        search_path = [search_path]
+    search_path = tuple(str(template_dir) for template_dir in search_path)
+
+    env = _template_environments.get(search_path)
+    if env is None:
+        env = Environment(
+            loader=FileSystemLoader(search_path),
+            autoescape=select_autoescape(),
+            undefined=StrictUndefined,
+            auto_reload=True,
+            bytecode_cache=get_template_bytecode_cache(),
+        )
+        env.globals["shlex"] = shlex
+        env = _template_environments.setdefault(search_path, env)
+
+    return env
+
 
 class _TemplatedBase:
     template_type = "build"
     entrypoint_script_name = "main.sh.j2"
+    render_manifest_name = "_cnc_manifest.json"
+    incremental = False
+    changed_outputs = ()
+    rendered_outputs = ()
+    _render_manifest = None
 
     def __repr__(self):
         return f"<{self.__class__.__name__} @ {self.working_dir} -> {self.config_files_path}>"
@@ -37,97 +129,122 @@ class _TemplatedBase:
         return f"{self.config_files_path}/_cnc_output"
 
     @property
-    def custom_template_dir(self):
-        return f"{self.config_files_path}/custom"
+    def render_manifest_path(self):
+        return f"{self.config_files_path}/{self.render_manifest_name}"
 
     @property
-    def current_timestamp(self):
-        return datetime.now().isoformat()
-
-    def setup(self, working_dir=None):
-        if not os.path.isdir(self.config_files_path):
-            os.makedirs(self.config_files_path, exist_ok=True)
-
-        if not os.path.isdir(self.rendered_files_path):
-            os.makedirs(self.rendered_files_path, exist_ok=True)
-
-        if self.template_config.enabled:
-            if not os.path.isdir(self.custom_template_dir):
-                os.makedirs(self.custom_template_dir, exist_ok=True)
-
-        self.copy_templates(working_dir=working_dir)
-        return True
+    def custom_template_dir(self):
+        return (
+            f"{self.working_dir}/{self.template_config.template_directory}"
+            f"/{self.template_type}"
+        )
 
-    def copy_template_dir(self, working_dir=None):
+    @property
+    def template_search_path(self):
+        """
+        Template directories in lookup order: custom (if enabled), then
+        flavor-specific, then shared defaults. Templates are loaded straight
+        from these directories, nothing is copied into config_files_path.
+        """
         src_dir = Path(__file__).parent.parent
-        cwd = working_dir or self.working_dir
-
-        # Path to the directory where templates are finally consolidated
-        final_template_dir = self.config_files_path
+        search_path = []
 
-        # Copy shared default templates
-        shared_template_dir = (
-            f"{src_dir}/flavors/{self.application.provider}"
-            f"/shared/{self.template_type}"
-        )
-        if os.path.isdir(shared_template_dir):
-            shutil.copytree(
-                shared_template_dir,
-                final_template_dir,
-                dirs_exist_ok=True,
+        # custom templates can overwrite any of the defaults
+        if self.template_config.enabled:
+            custom_root_dir = (
+                f"{self.working_dir}/{self.template_config.template_directory}"
             )
+            if not os.path.isdir(custom_root_dir):
+                raise Exception(f"Template directory {custom_root_dir} does not exist")
+
+            search_path.append(self.custom_template_dir)
 
-        # Copy flavor-specific templates, which can overwrite shared defaults
-        flavor_dir = (
+        # flavor-specific templates can overwrite shared defaults
+        search_path.append(
             f"{src_dir}/flavors/{self.application.provider}/"
             f"{self.application.flavor}/{self.application.version}"
             f"/{self.template_type}"
         )
-        if os.path.isdir(flavor_dir):
-            shutil.copytree(
-                flavor_dir,
-                final_template_dir,
-                dirs_exist_ok=True,
-            )
+        search_path.append(
+            f"{src_dir}/flavors/{self.application.provider}"
+            f"/shared/{self.template_type}"
+        )
 
-        # Copy custom templates if enabled, which can overwrite any of the defaults
-        if self.template_config.enabled:
-            custom_template_dir = Path(
-                f"{cwd}/{self.template_config.template_directory}"
-            )
+        return [d for d in search_path if os.path.isdir(d)]
 
-            if not custom_template_dir.is_dir():
-                raise Exception(
-                    f"Template directory {custom_template_dir} does not exist"
-                )
+    @property
+    def current_timestamp(self):
+        return datetime.now().isoformat()
 
-            custom_template_dir = Path(
-                f"{cwd}/{self.template_config.template_directory}/{self.template_type}"
-            )
+    def setup(self, working_dir=None):
+        if working_dir:
+            self.working_dir = working_dir
 
-            if custom_template_dir.is_dir():
-                shutil.copytree(
-                    str(custom_template_dir),
-                    final_template_dir,
-                    dirs_exist_ok=True,
-                )
+        if not os.path.isdir(self.rendered_files_path):
+            os.makedirs(self.rendered_files_path, exist_ok=True)
+
+        self.materialize_assets()
+        return True
 
+    def materialize_assets(self):
+        """
+        Hook for stages that need non-template files (e.g. lambda zips)
+        written next to the rendered output
+        """
         return True
 
+    def template_asset_path(self, name):
+        """Resolve a file or directory through the template search path"""
+        for template_dir in self.template_search_path:
+            asset_path = f"{template_dir}/{name}"
+            if os.path.exists(asset_path):
+                return asset_path
+
+    def template_exists(self, name):
+        return bool(self.template_asset_path(name))
+
+    def template_asset_files(self, name):
+        """
+        Files of the asset directory name merged across the template search
+        path, as {relative path: source path}. Custom files override
+        flavor-specific ones, which override shared defaults.
+        """
+        files = {}
+        for template_dir in reversed(self.template_search_path):
+            asset_dir = f"{template_dir}/{name}"
+            for dirpath, dirnames, filenames in os.walk(asset_dir):
+                dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    files[os.path.relpath(path, asset_dir)] = path
+
+        return files
+
+    def write_asset_archive(self, name):
+        """
+        Zips the (merged) asset directory name to rendered_files_path,
+        returns the zip's path or None if no template directory has it
+        """
+        files = self.template_asset_files(name)
+        if not files:
+            return None
+
+        archive_path = f"{self.rendered_files_path}/{name}.zip"
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for relative_path in sorted(files):
+                archive.write(files[relative_path], relative_path)
+
+        return archive_path
+
     def get_template(self, name, template_directory=None):
-        template_directory = template_directory or self.config_files_path
-        env = Environment(
-            loader=FileSystemLoader(template_directory),
-            autoescape=select_autoescape(),
-            undefined=StrictUndefined,
-        )
-        env.globals["shlex"] = shlex
+        template_directory = template_directory or self.template_search_path
+        env = get_template_environment(template_directory)
 
         try:
             return env.get_template(name)
         except Exception as e:
             log.warning(f"Could not get template ({name}): {e}")
-            self.debug_template_output_directory(template_directory)
+            self.debug_template_directory(template_directory)
             raise e
 
     def cleanup(self):
@@ -135,6 +252,7 @@ class _TemplatedBase:
             self.config_files_path,
             ignore_errors=True,
         )
+        self._render_manifest = None
         return True
 
     def template_context(self):
@@ -154,18 +272,136 @@ class _TemplatedBase:
             return
 
         output_name = output_name or ".".join(name.split(".")[:-1])
-        output_path = f"{self.rendered_files_path}/{output_name}"
-        with open(output_path, "w") as f:
-            # render template
-            template_context = context or self.template_context()
-            template_context.update(additional_context or {})
-            rendered = template.render(**template_context)
-            # strip excess newlines
-            cleaned = re.sub(r"\n\s*\n", "\n", rendered)
-            f.write(cleaned)
+        # render template
+        template_context = context or self.template_context()
+        template_context.update(additional_context or {})
+        if isinstance(template_context, LazyTemplateContext):
+            # only evaluate the expensive values the template can look up
+            template_context = self.resolve_lazy_context(template, template_context)
+
+        with profiler.template(name):
+            # stream the output to disk, stripping excess newlines as we go
+            rendered = collapse_blank_lines(template.generate(**template_context))
+            self.write_output(output_name, rendered)
+
+        return True
 
+    def resolve_lazy_context(self, template, template_context):
+        names = referenced_names(template.environment, template.name)
+        resolved = template_context.resolve(names)
+        if template_context.unused_keys:
+            log.debug(
+                f"Unused template context for {template.name} ({self}): "
+                f"{sorted(template_context.unused_keys)}"
+            )
+
+        return resolved
+
+    def write_output(self, output_name, chunks):
+        if isinstance(chunks, str):
+            chunks = [chunks]
+
+        output_path = f"{self.rendered_files_path}/{output_name}"
+        if not self.incremental:
+            with open(output_path, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            return True
+
+        manifest = self.render_manifest
+        self.rendered_outputs.add(output_name)
+        with AtomicWriter(output_path) as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+            digest = f.hexdigest()
+            if self._output_is_current(output_path, manifest.get(output_name), digest):
+                f.discard()
+                return False
+
+        stat = os.stat(output_path)
+        manifest[output_name] = {
+            "sha256": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        self.changed_outputs.append(output_name)
         return True
 
+    def _output_is_current(self, output_path, entry, digest):
+        if not entry or entry.get("sha256") != digest:
+            return False
+
+        # make sure nothing else touched the file since we wrote it
+        try:
+            stat = os.stat(output_path)
+        except FileNotFoundError:
+            return False
+
+        recorded = (entry.get("size"), entry.get("mtime_ns"))
+        return (stat.st_size, stat.st_mtime_ns) == recorded
+
+    @property
+    def render_manifest(self):
+        if self._render_manifest is None:
+            try:
+                with open(self.render_manifest_path) as f:
+                    self._render_manifest = json.load(f)
+            except (OSError, ValueError):
+                self._render_manifest = {}
+
+        return self._render_manifest
+
+    def check_incremental(self, should_cleanup):
+        if self.incremental and should_cleanup:
+            log.warning(
+                f"Incremental render for {self} has no effect with cleanup on, "
+                "the output directory is wiped first (use --no-cleanup)"
+            )
+
+    def prune_outputs(self, rendered_outputs):
+        """
+        Remove outputs (and their manifest entries) a previous render wrote
+        but this one didn't, e.g. scripts of a service that was removed
+        """
+        manifest = self.render_manifest
+        stale_outputs = sorted(set(manifest) - rendered_outputs)
+        for output_name in stale_outputs:
+            try:
+                os.remove(f"{self.rendered_files_path}/{output_name}")
+            except FileNotFoundError:
+                pass
+            del manifest[output_name]
+
+        if stale_outputs:
+            log.info(f"Removed stale outputs for {self}: {', '.join(stale_outputs)}")
+
+        return stale_outputs
+
+    def finish_render(self):
+        """
+        Prune stale outputs, persist the incremental render manifest and
+        return (and log) which outputs were rewritten since the last call
+        """
+        changed_outputs, self.changed_outputs = self.changed_outputs, []
+        rendered_outputs, self.rendered_outputs = self.rendered_outputs, set()
+        if not self.incremental:
+            return changed_outputs
+
+        stale_outputs = self.prune_outputs(rendered_outputs)
+        if changed_outputs or stale_outputs:
+            atomic_write(
+                self.render_manifest_path,
+                json.dumps(self.render_manifest, indent=2, sort_keys=True),
+            )
+
+        if changed_outputs:
+            log.info(f"Changed outputs for {self}: {', '.join(changed_outputs)}")
+        else:
+            log.info(f"No outputs changed for {self}")
+
+        return changed_outputs
+
     def _wrapped_write_template(self, *args, **kwargs):
         self.write_template(*args, **kwargs)
         return ""
@@ -192,9 +428,13 @@ class _TemplatedBase:
         subprocess.run(["ls", "-alhR", f"{template_directory}"])
 
     def debug_template_directory(self, template_directory=None):
-        template_directory = template_directory or f"{self.config_files_path}"
-        log.debug(f"\ndirectory is: {template_directory}\n")
-        subprocess.run(["ls", "-alhR", f"{template_directory}"])
+        template_directory = template_directory or self.template_search_path
+        if isinstance(template_directory, str):
+            template_directory = [template_directory]
+
+        for directory in template_directory:
+            log.debug(f"\ndirectory is: {directory}\n")
+            subprocess.run(["ls", "-alhR", f"{directory}"])
 
     def file_exists(self, file_path="Dockerfile"):
         return os.path.isfile(f"{self.working_dir}/{file_path}")
@@ -204,12 +444,18 @@ class CollectionTemplatedBase(_TemplatedBase):
     def __init__(
         self,
         collection,
+        incremental=False,
     ):
         self.application = collection.application
         self.collection = collection
         self.template_config = self.application.template_config
         self.working_dir = os.getcwd()
 
+        self.incremental = incremental
+        self.changed_outputs = []
+        self.rendered_outputs = set()
+        self._render_manifest = None
+
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.collection} | output_only: {self.output_only}>"
 
@@ -232,6 +478,8 @@ class EnvironmentTemplatedBase(_TemplatedBase):
         environment,
         service_tags=None,
         default_tag="latest",
+        incremental=False,
+        render_workers=1,
     ):
         self.environment = environment
 
@@ -248,12 +496,26 @@ class EnvironmentTemplatedBase(_TemplatedBase):
 
         self.working_dir = os.getcwd()
         self.default_tag = default_tag or "latest"
+        self.render_workers = render_workers or 1
+
+        self.incremental = incremental
+        self.changed_outputs = []
+        self.rendered_outputs = set()
+        self._render_manifest = None
 
     def __repr__(self):
         return f"<{self.__class__.__name__}:{self.environment} @ {self.service_tags}>"
 
     __str__ = __repr__
 
+    def setup(self, working_dir=None):
+        # nothing is memoized on services a lazy config hasn't loaded yet
+        if self.environment.config_loaded:
+            for service in self.environment.services:
+                service.reset_render_memos()
+
+        return super().setup(working_dir=working_dir)
+
     @cached_property
     def environment_items(self):
         _all = {}
@@ -266,6 +528,19 @@ class EnvironmentTemplatedBase(_TemplatedBase):
 
         return _all
 
+    def prefetch_secrets(self, services=None):
+        """
+        Lets the collection fetch every secret the environment's (or these
+        services') variables use in one go, instead of one per variable
+        """
+        items = list(self.environment.environment_items)
+        for service in self.environment.services if services is None else services:
+            items.extend(service.environment_secrets)
+
+        self.collection.prefetch_secrets(
+            {item.secret_id for item in items if item.secret_id}
+        )
+
     def service_environment_items(self, service):
         _all = {}
 
@@ -290,8 +565,60 @@ class EnvironmentTemplatedBase(_TemplatedBase):
 
         return self.environment.services
 
-    def copy_templates(self, working_dir=None):
-        self.copy_template_dir(working_dir=working_dir)
+    def services_to_render(self, service_names=None):
+        return [
+            service
+            for service in self.environment.services
+            if not (service_names and service.name not in service_names)
+            and not service.settings.is_resource
+        ]
+
+    def prepare_render(self):
+        """
+        Build the lazily cached state render threads share before they
+        start, so they only read it: the incremental manifest, flavor
+        metadata and the environment's managed & aliased variables
+        """
+        if self.incremental:
+            self.render_manifest
+
+        self.application.flavor_metadata
+        self.environment.managed_items
+        self.environment.managed_environment_items
+        self.environment.alias_resolver
+        self.environment.variable_index
+
+    def render_services(self, render_service, services):
+        """
+        Call render_service for each service, on a pool of render_workers
+        threads if more than one. Results are returned in service order,
+        errors are collected per service and raised together.
+        """
+        if self.render_workers <= 1 or len(services) <= 1:
+            return [render_service(service) for service in services]
+
+        self.prepare_render()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.render_workers
+        ) as executor:
+            futures = [executor.submit(render_service, service) for service in services]
+
+        results = []
+        errors = {}
+        for service, future in zip(services, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                log.error(f"Cannot render {service.name} for {self}: {e}")
+                errors[service.name] = e
+
+        if errors:
+            raise Exception(
+                f"Rendering failed for {len(errors)} service(s) "
+                f"({', '.join(errors.keys())}) for {self}"
+            ) from next(iter(errors.values()))
+
+        return results
 
     def tag_for_service(self, service_name=None):
         return self.service_tags.get(service_name, self.default_tag)
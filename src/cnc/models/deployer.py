@@ -1,4 +1,3 @@
-import os
 import subprocess
 
 from .cycle_stage_base import EnvironmentTemplatedBase
@@ -30,8 +29,9 @@ class DeployStageManager(EnvironmentTemplatedBase):
         }
 
     def render_scripts(self, service_names=None):
+        self.prefetch_secrets(self.services_to_render(service_names))
         context = self.template_context(None)
-        if os.path.isfile(f"{self.config_files_path}/pre_deploy_functions.sh.j2"):
+        if self.template_exists("pre_deploy_functions.sh.j2"):
             self.write_template(
                 "pre_deploy_functions.sh.j2",
                 output_name=f"pre-deploy-{self.environment.name}-functions.sh",
@@ -44,29 +44,29 @@ class DeployStageManager(EnvironmentTemplatedBase):
             )
             self.scripts_to_run.append(f"pre-deploy-{self.environment.name}.sh")
 
-        for service in self.environment.services:
-            if service_names:
-                if service.name not in service_names:
-                    continue
-
-            if service.settings.is_resource:
-                continue
-
-            context = self.template_context(service)
-            context["render_template"] = self.write_template_with_context(service)
-
-            self.write_template(
-                "deploy_functions.sh.j2",
-                output_name=f"deploy-{service.name}-functions.sh",
-                context=context,
-            )
-            self.write_template(
-                "main.sh.j2", output_name=f"deploy-{service.name}.sh", context=context
-            )
-            self.scripts_to_run.append(f"deploy-{service.name}.sh")
+        services = self.services_to_render(service_names)
+        self.scripts_to_run.extend(
+            self.render_services(self.render_service_scripts, services)
+        )
+        self.finish_render()
+
+    def render_service_scripts(self, service):
+        context = self.template_context(service)
+        context["render_template"] = self.write_template_with_context(service)
+
+        self.write_template(
+            "deploy_functions.sh.j2",
+            output_name=f"deploy-{service.name}-functions.sh",
+            context=context,
+        )
+        self.write_template(
+            "main.sh.j2", output_name=f"deploy-{service.name}.sh", context=context
+        )
+        return f"deploy-{service.name}.sh"
 
     def perform(self, should_cleanup=True, should_regenerate_config=True, debug=False):
         log.debug(f"Performing deploy for {self} @ {self.config_files_path}")
+        self.check_incremental(should_cleanup)
         if should_cleanup:
             self.cleanup()
         self.setup()
@@ -1,20 +1,27 @@
 import re
-import yaml
+import json
+import hashlib
 import traceback
+import threading
+from functools import cached_property
 import string
-from typing import List, Optional
+from typing import ClassVar, List, Optional
 from pydantic import model_validator, ValidationInfo, field_validator, Field
 
 from .base_model import BaseModel, IgnoredType
-from .environment_variable import EnvironmentVariable
-from .config import AppConfig
+from .environment_variable import EnvironmentVariable, AliasResolver, VariableIndex
+from .config import AppConfig, ManagedEnvironmentItems
 from .resource_use_existing import ResourceUseExistingSettings
 from cnc.utils import clean_name_string
+from cnc.utils.yaml_io import load_yaml_file, copy_yaml_data
 
 from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
+# services can be rendered concurrently, only validate a lazy config once
+_load_config_lock = threading.RLock()
+
 
 class Environment(BaseModel):
     name: str
@@ -35,15 +42,25 @@ class Environment(BaseModel):
     raw_existing_resources: Optional[List[ResourceUseExistingSettings]] = Field(
         alias="existing_resources", default=[]
     )
+    # AppConfig from config_data, see load_config
+    loaded_config: Optional[IgnoredType] = None
 
     # ------------------------------
     # Parent relationships
     # (not meant to be set directly from configuration file)
     # ------------------------------
-    config: Optional[IgnoredType] = IgnoredType()
     application: Optional[IgnoredType] = IgnoredType()
     collection: Optional[IgnoredType] = IgnoredType()
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "_services",
+        "_managed_items",
+        "_managed_environment_items",
+        "_alias_resolver",
+        "_variable_index",
+        "instance_name",
+    ]
+
     # ------------------------------
     # Validators
     # ------------------------------
@@ -61,42 +78,19 @@ class Environment(BaseModel):
     @model_validator(mode="after")
     def ensure_config_data(self):
         """
-        Loads config data from file if not already set
+        Loads config data from file if not already set.
+        AppConfig is validated once the environment is linked to its
+        application (see Application.validate_environments), or on first
+        access to config if the application is loaded lazily
         """
         if not self.config_data:
             if self.config_file_path:
-                with open(self.config_file_path) as coherence_yml_data:
-                    self.config_data = yaml.safe_load(coherence_yml_data)
+                self.config_data = load_yaml_file(self.config_file_path)
             else:
                 log.debug("No config data and no config file path!")
                 raise ValueError(f"No config data and no config file path for {self}!")
 
         self.config_data["environment"] = self
-
-        try:
-            self.config = AppConfig.model_validate(
-                self.config_data, context={"provider": self.provider}
-            )
-        except Exception as e:
-            log.warning(
-                f"Cannot get AppConfig for environment! {traceback.format_exc()}"
-            )
-            raise e
-
-        return self
-
-    @model_validator(mode="after")
-    def annotate_children(self):
-        if self.config:
-            for svc in self.config.services + self.config.settings.explicit_resources:
-                svc.environment = self
-
-        for variable in self.environment_variables:
-            variable.environment = self
-
-        if self.database_password:
-            self.database_password.environment = self
-
         return self
 
     @field_validator("database_password", mode="before")
@@ -109,6 +103,74 @@ class Environment(BaseModel):
     def validate_raw_existing_resources(cls, value: dict) -> list[dict]:
         return cls.convert_dict_keys_to_names(value)
 
+    # ------------------------------
+    # Config
+    # ------------------------------
+    def load_config(self):
+        """
+        Environments of an application with identical config_data (e.g.
+        previews sharing a cnc.yml) only validate it once, the others get a
+        copy of the first AppConfig bound to them (see AppConfig.copy_for).
+        Each environment keeps its own config_data.
+        """
+        fingerprint = self.config_fingerprint()
+        shared_configs = self.application.shared_configs
+        with _load_config_lock:
+            shared_config = shared_configs.get(fingerprint) if fingerprint else None
+
+        if shared_config is not None:
+            config = shared_config.copy_for(self)
+        else:
+            # AppConfig validators write into the data they're given,
+            # config_data stays as loaded (see EnvironmentCollection.unique_id)
+            data = copy_yaml_data(self.config_data)
+            data["environment"] = self
+            try:
+                config = AppConfig.model_validate(
+                    data, context={"provider": self.provider}
+                )
+            except Exception as e:
+                log.warning(
+                    f"Cannot get AppConfig for environment! {traceback.format_exc()}"
+                )
+                raise e
+
+            if fingerprint:
+                with _load_config_lock:
+                    shared_configs[fingerprint] = config
+
+        self.loaded_config = config
+        return config
+
+    def config_fingerprint(self):
+        data = {k: v for k, v in self.config_data.items() if k != "environment"}
+        try:
+            _state = json.dumps([self.provider, data], sort_keys=True, default=str)
+        except TypeError:
+            # e.g. mixed key types, don't share
+            return None
+
+        return hashlib.sha256(_state.encode()).hexdigest()
+
+    @property
+    def config(self):
+        if self.loaded_config is None:
+            with _load_config_lock:
+                if self.loaded_config is None:
+                    self.load_config()
+                    try:
+                        self.application.validate_environment(self)
+                    except Exception:
+                        self.loaded_config = None
+                        self._services = []
+                        raise
+
+        return self.loaded_config
+
+    @property
+    def config_loaded(self):
+        return self.loaded_config is not None
+
     # ------------------------------
     # Properties
     # ------------------------------
@@ -126,14 +188,18 @@ class Environment(BaseModel):
 
     @property
     def services(self):
-        if not hasattr(self, "_services"):
-            self._services = []
+        services = getattr(self, "_services", None)
+        if not services:
+            # a lazy config validates services on load, so load it first
+            config = self.config
+            services = []
+            if config:
+                services = config.services + config.settings.explicit_resources
 
-        if not self._services and self.config:
-            self._services += self.config.services
-            self._services += self.config.settings.explicit_resources
+            # assigned once complete, concurrent renders only see a full list
+            self._services = services
 
-        return self._services
+        return services
 
     @property
     def web_services(self):
@@ -237,7 +303,7 @@ class Environment(BaseModel):
         # order here is important so we return env-level first in the array!
         return self.raw_existing_resources + self.collection.existing_resources
 
-    @property
+    @cached_property
     def instance_name(self):
         _name = (
             f"{self.collection.cloud_resource_namespace[:10]}-{self.application.name[-8:]}"
@@ -250,17 +316,43 @@ class Environment(BaseModel):
 
         return re.sub("[\\W_]+$", "", clean)
 
+    @property
+    def managed_items(self):
+        # rebuilt after the collection's infra outputs are refreshed
+        if not hasattr(self, "_managed_items"):
+            self._managed_items = ManagedEnvironmentItems(self.config)
+
+        return self._managed_items
+
     @property
     def managed_environment_items(self):
-        return (
-            self.config.managed_environment_variables
-            + self.config.managed_environment_secrets
-        )
+        # rebuilt after the collection's infra outputs are refreshed
+        if not hasattr(self, "_managed_environment_items"):
+            self._managed_environment_items = (
+                self.config.managed_environment_variables
+                + self.config.managed_environment_secrets
+            )
+
+        return self._managed_environment_items
 
     @property
     def environment_items(self):
         return self.environment_variables + self.managed_environment_items
 
+    @property
+    def alias_resolver(self):
+        if not hasattr(self, "_alias_resolver"):
+            self._alias_resolver = AliasResolver(self)
+
+        return self._alias_resolver
+
+    @property
+    def variable_index(self):
+        if not hasattr(self, "_variable_index"):
+            self._variable_index = VariableIndex(self.environment_variables)
+
+        return self._variable_index
+
     # ------------------------------
     # Instance methods
     # ------------------------------
@@ -278,13 +370,26 @@ class Environment(BaseModel):
         )
 
     def variable_by_name(self, name):
-        for variable in self.environment_variables + self.managed_environment_items:
-            if variable.name == name:
-                return variable
-        log.debug(f"{name} var not found for {self}")
+        variable = self.user_variable_by_name(name)
+        if variable is None:
+            variable = self.managed_item_by_name(name)
+
+        if variable is None:
+            log.debug(f"{name} var not found for {self}")
+        return variable
+
+    def user_variable_by_name(self, name):
+        return self.name_index("environment_variables").get(
+            self.environment_variables, name
+        )
+
+    def managed_item_by_name(self, name):
+        return self.name_index("managed_environment_items").get(
+            self.managed_environment_items, name
+        )
 
     def service_by_name(self, name):
-        for service in self.services:
-            if service.name == name:
-                return service
-        log.debug(f"{name} service not found for {self}")
+        service = self.name_index("services").get(self.services, name)
+        if service is None:
+            log.debug(f"{name} service not found for {self}")
+        return service
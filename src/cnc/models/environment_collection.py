@@ -2,9 +2,11 @@ import re
 import hashlib
 import json
 import string
-from typing import List, Optional
+import threading
+from functools import cached_property
+from typing import ClassVar, List, Optional
 
-from pydantic import model_validator, field_validator, Field
+from pydantic import field_validator, Field
 
 from .environment import Environment
 from .base_model import BaseModel, IgnoredType
@@ -18,6 +20,9 @@ from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
+# services can be rendered concurrently, only fetch TF outputs once
+_infra_outputs_lock = threading.RLock()
+
 
 class IntegrationSettings(BaseModel):
     data: Optional[dict] = None
@@ -45,25 +50,16 @@ class EnvironmentCollection(BaseModel):
     # ------------------------------
     application: Optional[IgnoredType] = IgnoredType()
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "_services_by_type",
+        "cloud_resource_namespace",
+        "instance_name",
+        "unique_id",
+    ]
+
     # ------------------------------
     # Validators
     # ------------------------------
-    @model_validator(mode="after")
-    def annotate_children(self):
-        for environment in self.environments:
-            environment.collection = self
-
-            for variable in environment.environment_variables:
-                variable.collection = self
-
-            if environment.database_password:
-                environment.database_password.collection = self
-
-        if self.database_password:
-            self.database_password.collection = self
-
-        return self
-
     @field_validator("existing_resources", mode="before")
     def validate_existing_resources(cls, value: dict) -> list[dict]:
         return cls.convert_dict_keys_to_names(value)
@@ -82,7 +78,7 @@ class EnvironmentCollection(BaseModel):
     # ------------------------------
     # Properties
     # ------------------------------
-    @property
+    @cached_property
     def cloud_resource_namespace(self):
         return self.__class__.calculate_cloud_resource_namespace(
             self.account_id, self.application.name, self.name
@@ -99,7 +95,7 @@ class EnvironmentCollection(BaseModel):
         _hash = _hash.hexdigest()
         return f"c{_hash[:11]}"
 
-    @property
+    @cached_property
     def instance_name(self):
         _name = (
             f"{self.cloud_resource_namespace[:12]}-{self.application.name[-12:]}"
@@ -120,15 +116,21 @@ class EnvironmentCollection(BaseModel):
         elif self.application.provider_is_aws:
             return AmazonAppServiceAccount(collection=self)
 
-    @property
+    @cached_property
     def unique_id(self):
+        """
+        Hash of the collection's environments and their config_data as
+        loaded from cnc.yml, the same whether or not (or when) their
+        AppConfigs are validated
+        """
         _state = f"{self.cloud_resource_namespace}:{self.name}"
 
         for environment in self.environments:
             _state = _state + environment.name
 
-            _data = environment.config_data.copy()
-            del _data["environment"]
+            _data = {
+                k: v for k, v in environment.config_data.items() if k != "environment"
+            }
 
             _state = _state + json.dumps(_data, sort_keys=True)
 
@@ -313,44 +315,68 @@ class EnvironmentCollection(BaseModel):
 
     def all_services_for_type(self, service_type=None):
         "non-unique, returns all active services by service_type"
-        _all = []
-        for environment in self.active_environments:
-            for service in environment.services:
-                if service_type:
-                    if isinstance(service_type, list):
-                        if service.settings.type not in service_type:
-                            continue
-                    elif service.settings.type != service_type:
-                        continue
-
-                _all.append(service)
-
-        return sorted(_all, key=lambda x: x.settings.unique_id)
+        services, services_by_type = self.services_by_type
+        if not service_type:
+            return list(services)
+        elif isinstance(service_type, list):
+            return [s for s in services if s.settings.type in service_type]
+
+        return list(services_by_type.get(service_type, []))
+
+    @property
+    def services_by_type(self):
+        """
+        (all active services, {service type: active services}), sorted by
+        unique_id. Built once, see invalidate_caches.
+        """
+        if not hasattr(self, "_services_by_type"):
+            services = sorted(
+                [
+                    service
+                    for environment in self.active_environments
+                    for service in environment.services
+                ],
+                key=lambda x: x.settings.unique_id,
+            )
+            services_by_type = {}
+            for service in services:
+                services_by_type.setdefault(service.settings.type, []).append(service)
+
+            self._services_by_type = (services, services_by_type)
+
+        return self._services_by_type
 
     def infra_outputs(self, force_cache_refresh=False):
-        _config = None
-
-        if "infrastructure_outputs" not in self.data:
-            try:
-                if (not hasattr(self, "_infra_outputs_cache")) or force_cache_refresh:
-                    log.debug(f"Going to get outputs for {self}: {self.data}")
-                    _config = ProvisionStageManager(
-                        self,
-                        output_only=True,
-                    )
-                    if not _config.make_ready_for_use():
-                        raise Exception("Make ready for use failed")
-
-                    self._infra_outputs_cache = _config.output()
-            except Exception as e:
-                log.debug(f"Cannot get TF outputs for {self}: {e}")
-                if not hasattr(self, "_infra_outputs_cache"):
-                    self._infra_outputs_cache = {}
-            finally:
-                if _config:
-                    _config.cleanup()
-        else:
-            self._infra_outputs_cache = {}
+        with _infra_outputs_lock:
+            _config = None
+
+            if "infrastructure_outputs" not in self.data:
+                try:
+                    if (
+                        not hasattr(self, "_infra_outputs_cache")
+                    ) or force_cache_refresh:
+                        log.debug(f"Going to get outputs for {self}: {self.data}")
+                        _config = ProvisionStageManager(
+                            self,
+                            output_only=True,
+                        )
+                        if not _config.make_ready_for_use():
+                            raise Exception("Make ready for use failed")
+
+                        self._infra_outputs_cache = _config.output()
+                        if force_cache_refresh:
+                            # managed variables are built from the outputs
+                            for environment in self.environments:
+                                environment.invalidate_caches()
+                except Exception as e:
+                    log.debug(f"Cannot get TF outputs for {self}: {e}")
+                    if not hasattr(self, "_infra_outputs_cache"):
+                        self._infra_outputs_cache = {}
+                finally:
+                    if _config:
+                        _config.cleanup()
+            else:
+                self._infra_outputs_cache = {}
 
         infra_outputs = {}
         infra_outputs.update(self.data.get("infrastructure_outputs", {}))
@@ -358,6 +384,10 @@ class EnvironmentCollection(BaseModel):
 
         return infra_outputs
 
+    def prefetch_secrets(self, secret_ids):
+        """Providers that can fetch secrets in bulk do it here"""
+        pass
+
     def get_terraform_output(self, output_name, force_cache_refresh=False):
         return (
             self.infra_outputs(force_cache_refresh=force_cache_refresh)
@@ -369,6 +399,4 @@ class EnvironmentCollection(BaseModel):
         return True
 
     def environment_by_name(self, environment_name):
-        for environment in self.environments:
-            if environment.name == environment_name:
-                return environment
+        return self.name_index("environments").get(self.environments, environment_name)
@@ -1,19 +1,189 @@
+import re
+import heapq
 import hashlib
 import traceback
 
-from typing import Optional
+from functools import cached_property, lru_cache
+from typing import ClassVar, List, Optional
 from pydantic import model_validator, ValidationInfo, Field
-from jinja2 import Template
 
 from .base_model import BaseModel, IgnoredType
 
 from cnc.constants import EnvironmentVariableTypes, EnvironmentVariableDestinations
 from cnc.utils import clean_name_string
+from cnc.utils.render import inline_template
 from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
 
+def resolve_aliases(variables):
+    """
+    Maps the name of every alias in variables to the name it finally
+    points at (aliases of aliases are followed), each alias is visited
+    once. Raises ValueError on alias cycles.
+    """
+    variables_by_name = {}
+    for variable in variables:
+        variables_by_name.setdefault(variable.name, variable)
+
+    targets = {}
+    for variable in variables:
+        if not variable.alias or variable.name in targets:
+            continue
+
+        chain = [variable.name]
+        name = variable.alias
+        while name not in targets:
+            other_variable = variables_by_name.get(name)
+            if not (other_variable and other_variable.alias):
+                break
+            if name in chain:
+                raise ValueError(
+                    f"Alias cycle for environment variable {variable.name}: "
+                    f"{' -> '.join(chain + [name])}"
+                )
+            chain.append(name)
+            name = other_variable.alias
+
+        target = targets.get(name, name)
+        for alias_name in chain:
+            targets[alias_name] = target
+
+    return targets
+
+
+class AliasResolver:
+    """
+    Resolves the aliases of an environment's variables (see
+    Environment.alias_resolver). Targets are looked up by name in the
+    environment's items and their secret ids, output names and values
+    are cached.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.targets = resolve_aliases(environment.environment_variables)
+        self.secret_ids = {}
+        self.output_names = {}
+        self.values = {}
+
+    def target(self, variable):
+        """The (non alias) item variable.alias resolves to"""
+        name = self.targets.get(variable.alias, variable.alias)
+        return self.environment.variable_by_name(name)
+
+    def _resolved(self, cache, variable, resolve):
+        if variable.alias not in cache:
+            target = self.target(variable)
+            cache[variable.alias] = resolve(target) if target else None
+
+        return cache[variable.alias]
+
+    def secret_id(self, variable):
+        return self._resolved(
+            self.secret_ids,
+            variable,
+            lambda target: (
+                target.secret_id
+                if target.variable_type == target.VARIABLE_TYPE_SECRET
+                else None
+            ),
+        )
+
+    def output_name(self, variable):
+        return self._resolved(
+            self.output_names, variable, lambda target: target.output_name
+        )
+
+    def value_target(self, variable):
+        """
+        The item whose value variable.alias resolves to. Managed items
+        shadow user variables of the same name at every step.
+        """
+        name, seen = variable.alias, set()
+        while name not in seen:
+            seen.add(name)
+            target = self.environment.managed_item_by_name(name)
+            if target is None:
+                target = self.environment.user_variable_by_name(name)
+            if not (target and target.alias):
+                return target
+            name = target.alias
+
+    def value(self, variable):
+        if variable.alias not in self.values:
+            target = self.value_target(variable)
+            self.values[variable.alias] = target.value if target else None
+
+        return self.values[variable.alias]
+
+
+@lru_cache(maxsize=None)
+def compiled_pattern(pattern):
+    return re.compile(pattern)
+
+
+class VariableIndex:
+    """
+    An environment's variables bucketed by service and variable type (see
+    Environment.variable_index), aliases are also bucketed under the type
+    of the variable they resolve to. Results are cached per query.
+    """
+
+    def __init__(self, variables):
+        # (position, variable) so buckets can be merged in variables order
+        self.by_type = {}
+        self.by_service_type = {}
+        self.results = {}
+
+        for position, variable in enumerate(variables):
+            for variable_type in [None] + self.types_for(variable):
+                entry = (position, variable)
+                self.by_type.setdefault(variable_type, []).append(entry)
+                self.by_service_type.setdefault(
+                    (variable.service or None, variable_type), []
+                ).append(entry)
+
+    @staticmethod
+    def types_for(variable):
+        types = [variable.variable_type]
+        if variable.alias:
+            if variable.secret_id:
+                types.append(variable.VARIABLE_TYPE_SECRET)
+            if variable.output_name:
+                types.append(variable.VARIABLE_TYPE_OUTPUT)
+            if not (variable.secret_id or variable.output_name):
+                types.append(variable.VARIABLE_TYPE_STANDARD)
+
+        return types
+
+    def filter(self, service_name=None, variable_type=None, pattern=None):
+        """
+        Variables for service_name (those without a service apply to every
+        service) of variable_type whose names match pattern, in order
+        """
+        variable_type = variable_type or None
+        key = (service_name or None, variable_type, pattern)
+        if key not in self.results:
+            if service_name:
+                entries = heapq.merge(
+                    self.by_service_type.get((None, variable_type), []),
+                    self.by_service_type.get((service_name, variable_type), []),
+                )
+            else:
+                entries = self.by_type.get(variable_type, [])
+
+            regex = compiled_pattern(pattern) if pattern else None
+            self.results[key] = [
+                variable
+                for _, variable in entries
+                if not regex or regex.match(variable.name)
+            ]
+
+        return list(self.results[key])
+
+
 class EnvironmentVariable(
     BaseModel, EnvironmentVariableTypes, EnvironmentVariableDestinations
 ):
@@ -28,6 +198,10 @@ class EnvironmentVariable(
     collection: Optional[IgnoredType] = Field(default_factory=IgnoredType)
     environment: Optional[IgnoredType] = Field(default_factory=IgnoredType)
 
+    cached_attributes: ClassVar[List[str]] = BaseModel.cached_attributes + [
+        "instance_name"
+    ]
+
     @model_validator(mode="before")
     def validate_existing_info(cls, data: dict, info: ValidationInfo):
         if not (
@@ -41,7 +215,7 @@ class EnvironmentVariable(
             )
         return data
 
-    @property
+    @cached_property
     def instance_name(self):
         base_name = self.collection.instance_name
         if self.environment:
@@ -57,23 +231,16 @@ class EnvironmentVariable(
     @property
     def secret_id(self):
         if self.variable_type == self.VARIABLE_TYPE_ALIAS:
-            for other_variable in self.environment.environment_items:
-                if (
-                    other_variable.name == self.alias
-                    and other_variable.variable_type == self.VARIABLE_TYPE_SECRET
-                ):
-                    return other_variable.secret_id
+            return self.environment.alias_resolver.secret_id(self)
         if self.variable_type == self.VARIABLE_TYPE_SECRET:
             return self.raw_secret_id
 
     @property
     def output_name(self):
         if self.variable_type == self.VARIABLE_TYPE_ALIAS:
-            for other_variable in self.environment.environment_variables:
-                if other_variable.name == self.alias:
-                    return other_variable.output_name
+            return self.environment.alias_resolver.output_name(self)
         if self.variable_type == self.VARIABLE_TYPE_OUTPUT:
-            template = Template(self.raw_output_name)
+            template = inline_template(self.raw_output_name)
             context = {
                 "environment": {"name": self.environment.name},
                 "collection": {
@@ -84,6 +251,10 @@ class EnvironmentVariable(
 
     @property
     def value(self):
+        if self.variable_type == self.VARIABLE_TYPE_ALIAS:
+            # alias cycles are raised, not logged
+            alias_resolver = self.environment.alias_resolver
+
         try:
             if self.variable_type == self.VARIABLE_TYPE_SECRET:
                 return self.environment.collection.get_secret_value(self.secret_id)
@@ -94,12 +265,7 @@ class EnvironmentVariable(
                     self.output_name
                 )
             if self.variable_type == self.VARIABLE_TYPE_ALIAS:
-                for other_variable in (
-                    self.environment.managed_environment_items
-                    + self.environment.environment_variables
-                ):
-                    if other_variable.name == self.alias:
-                        return other_variable.value
+                return alias_resolver.value(self)
         except Exception:
             log.warning(
                 f"Cannot get value for variable {self.name}: {traceback.format_exc()}"
@@ -1,17 +1,22 @@
-import os
-import shutil
-import boto3
-import json
+import threading
+
 from cnc.models import EnvironmentCollection
-from typing import Literal
+from typing import ClassVar, List, Literal
+from .secrets import SecretsResolver
 from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
+_secrets_lock = threading.Lock()
+
 
 class AWSEnvironmentCollection(EnvironmentCollection):
     provider: Literal["aws"]
 
+    cached_attributes: ClassVar[List[str]] = EnvironmentCollection.cached_attributes + [
+        "_secrets"
+    ]
+
     # ------------------------------
     # Properties
     # ------------------------------
@@ -153,42 +158,30 @@ class AWSEnvironmentCollection(EnvironmentCollection):
         config.cleanup()
         return {"ok": _ok, "results": res["results"], "steps": res["steps"]}
 
-    def get_secret_value(self, secret_id, version_id=None):
-        secrets_client = boto3.client("secretsmanager")
-
-        inner_json_key = None
-        secret_id_parts = secret_id.rstrip(":").split(":")
-        if len(secret_id_parts) > 1:
-            secret_id, inner_json_key = secret_id_parts
+    @property
+    def secrets(self):
+        # one resolver (and its cache) for every render thread
+        if not hasattr(self, "_secrets"):
+            with _secrets_lock:
+                if not hasattr(self, "_secrets"):
+                    self._secrets = SecretsResolver()
 
-        kwargs = {"SecretId": secret_id}
-        if version_id:
-            kwargs["VersionId"] = version_id
+        return self._secrets
 
-        secret_string = secrets_client.get_secret_value(**kwargs).get("SecretString")
-        if inner_json_key:
-            return json.loads(secret_string)[inner_json_key]
+    def prefetch_secrets(self, secret_ids):
+        self.secrets.prefetch(secret_ids)
 
-        return secret_string
+    def get_secret_value(self, secret_id, version_id=None):
+        return self.secrets.get_secret_value(secret_id, version_id=version_id)
 
-    def generate_tf_assets(self, config_files_path, rendered_files_path):
+    def generate_tf_assets(self, manager):
+        # asset directories are merged across the template search path
+        # (custom -> flavor -> shared), only the zips are written out
         if self.has_serverless_services:
-            lambda_payload_path = os.path.join(
-                rendered_files_path, "lambda_function_payload"
-            )
-            shutil.make_archive(
-                lambda_payload_path,
-                "zip",
-                root_dir=(f"{config_files_path}/lambda_function_payload"),
-            )
+            manager.write_asset_archive("lambda_function_payload")
 
         log.debug(f"Generating provider assets for {self}...")
-        # Zip the js file
-        # ensure its in env_collection config_files_path
-        zip_file_path = os.path.join(rendered_files_path, "frontend_routing_lambda")
-        shutil.make_archive(
-            zip_file_path,
-            "zip",
-            root_dir=(f"{config_files_path}/frontend_routing_lambda"),
-        )
+        if not manager.write_asset_archive("frontend_routing_lambda"):
+            log.debug(f"No frontend routing lambda for {manager}")
+
         return True
@@ -0,0 +1,130 @@
+import json
+import threading
+
+from cnc.logger import get_logger
+
+log = get_logger(__name__)
+
+# BatchGetSecretValue accepts up to 20 secret ids per call
+BATCH_SIZE = 20
+
+
+def split_secret_id(secret_id):
+    """secret-name:json_key -> (secret-name, json_key)"""
+    inner_json_key = None
+    secret_id_parts = secret_id.rstrip(":").split(":")
+    if len(secret_id_parts) > 1:
+        secret_id, inner_json_key = secret_id_parts
+
+    return secret_id, inner_json_key
+
+
+class SecretsResolver:
+    """
+    Secrets Manager values for a collection (see
+    AWSEnvironmentCollection.secrets). Secrets passed to prefetch are fetched
+    with BatchGetSecretValue, anything else (or anything a batch didn't
+    return) with GetSecretValue. Secret strings are cached and JSON secrets
+    are parsed once, so every json_key of a secret is served from memory.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._client_error = None
+        self._client_lock = threading.Lock()
+        # (secret_id, version_id) -> SecretString
+        self.secret_strings = {}
+        self.parsed_secrets = {}
+
+    @property
+    def client(self):
+        # one client for every call, boto3 clients are thread safe
+        # (the default session creating them isn't)
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None and self._client_error is None:
+                    import boto3
+
+                    try:
+                        self._client = boto3.client("secretsmanager")
+                    except Exception as e:
+                        # e.g. no region configured, don't retry for every secret
+                        self._client_error = e
+
+        if self._client is None:
+            raise self._client_error.with_traceback(None)
+
+        return self._client
+
+    def prefetch(self, secret_ids):
+        to_fetch = set()
+        for secret_id in secret_ids:
+            try:
+                to_fetch.add(split_secret_id(secret_id)[0])
+            except ValueError:
+                # malformed, get_secret_value reports it for its variable
+                continue
+
+        secret_ids = sorted(
+            to_fetch
+            - {
+                secret_id
+                for secret_id, version_id in self.secret_strings
+                if version_id is None
+            }
+        )
+
+        for start in range(0, len(secret_ids), BATCH_SIZE):
+            self.fetch_batch(secret_ids[start : start + BATCH_SIZE])
+
+    def fetch_batch(self, secret_ids):
+        kwargs = {"SecretIdList": secret_ids}
+        try:
+            while True:
+                response = self.client.batch_get_secret_value(**kwargs)
+                for secret in response.get("SecretValues", []):
+                    # secrets can be requested by name or ARN
+                    for secret_id in [secret.get("Name"), secret.get("ARN")]:
+                        if secret_id in secret_ids:
+                            self.secret_strings[(secret_id, None)] = secret.get(
+                                "SecretString"
+                            )
+
+                for error in response.get("Errors", []):
+                    log.debug(
+                        f"Cannot batch get secret {error.get('SecretId')}: "
+                        f"{error.get('ErrorCode')} {error.get('Message')}"
+                    )
+
+                if not response.get("NextToken"):
+                    break
+                kwargs["NextToken"] = response["NextToken"]
+        except Exception as e:
+            # e.g. no secretsmanager:BatchGetSecretValue permission,
+            # secrets are then fetched one at a time
+            log.debug(f"Cannot batch get secrets {secret_ids}: {e}")
+
+    def secret_string(self, secret_id, version_id=None):
+        key = (secret_id, version_id)
+        if key not in self.secret_strings:
+            kwargs = {"SecretId": secret_id}
+            if version_id:
+                kwargs["VersionId"] = version_id
+
+            self.secret_strings[key] = self.client.get_secret_value(**kwargs).get(
+                "SecretString"
+            )
+
+        return self.secret_strings[key]
+
+    def get_secret_value(self, secret_id, version_id=None):
+        secret_id, inner_json_key = split_secret_id(secret_id)
+        secret_string = self.secret_string(secret_id, version_id)
+        if not inner_json_key:
+            return secret_string
+
+        key = (secret_id, version_id)
+        if key not in self.parsed_secrets:
+            self.parsed_secrets[key] = json.loads(secret_string)
+
+        return self.parsed_secrets[key][inner_json_key]
@@ -1,5 +1,5 @@
-from typing import Optional
-from google.cloud import secretmanager
+import threading
+from typing import ClassVar, List, Optional
 
 from cnc.models import EnvironmentCollection
 from typing import Literal
@@ -8,11 +8,32 @@ from cnc.logger import get_logger
 
 log = get_logger(__name__)
 
+_secret_manager_lock = threading.Lock()
+
 
 class GCPEnvironmentCollection(EnvironmentCollection):
     provider: Literal["gcp"]
     allow_net_admin: Optional[bool] = False
 
+    cached_attributes: ClassVar[List[str]] = EnvironmentCollection.cached_attributes + [
+        "_secret_manager_client"
+    ]
+
+    @property
+    def secret_manager_client(self):
+        # one client for every secret and render thread, creating
+        # clients isn't thread safe (using one is)
+        if not hasattr(self, "_secret_manager_client"):
+            with _secret_manager_lock:
+                if not hasattr(self, "_secret_manager_client"):
+                    from google.cloud import secretmanager
+
+                    self._secret_manager_client = (
+                        secretmanager.SecretManagerServiceClient()
+                    )
+
+        return self._secret_manager_client
+
     def get_secret_value(self, secret_id, version_id="latest"):
         """
         Access a secret version in Secret Manager.
@@ -24,8 +45,7 @@ class GCPEnvironmentCollection(EnvironmentCollection):
         Returns:
         The secret value as a string.
         """
-        # Create the Secret Manager client.
-        client = secretmanager.SecretManagerServiceClient()
+        client = self.secret_manager_client
 
         # Build the resource name of the secret version.
         name = f"projects/{self.account_id}/secrets/{secret_id}/versions/{version_id}"
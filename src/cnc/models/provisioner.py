@@ -6,8 +6,8 @@ import time
 import base64
 import re
 
-import pygohcl
 from .cycle_stage_base import CollectionTemplatedBase
+from .template_context import LazyTemplateContext
 
 from cnc.logger import get_logger
 
@@ -19,7 +19,7 @@ class ProvisionStageManager(CollectionTemplatedBase):
     entrypoint_script_name = "main.tf.j2"
 
     def __init__(self, *args, **kwargs):
-        super().__init__(*args)
+        super().__init__(*args, incremental=kwargs.get("incremental", False))
         self.output_only = kwargs.get("output_only", False)
 
     @property
@@ -29,8 +29,8 @@ class ProvisionStageManager(CollectionTemplatedBase):
     @property
     def infra_state_hash(self):
         # this is the template, not the rendered TF file
-        main_tpl = f"{self.config_files_path}/main.tf.j2"
-        if not os.path.isfile(main_tpl):
+        main_tpl = self.template_asset_path("main.tf.j2")
+        if not main_tpl:
             log.info(f"{main_tpl} not a file...")
             return ""
 
@@ -54,6 +54,7 @@ class ProvisionStageManager(CollectionTemplatedBase):
         should_regenerate_config=True,
         init=True,
     ):
+        self.check_incremental(should_cleanup)
         if should_cleanup:
             log.debug(f"Cleaning up & setting up at start for {self}")
 
@@ -72,63 +73,69 @@ class ProvisionStageManager(CollectionTemplatedBase):
             ):
                 return False
 
+            self.finish_render()
+
         if init:
             return self.init()
 
         return True
 
     def template_context(self):
-        if self.application.provider_is_aws:
-            frontend_names = []
-            for svc in self.collection.frontend_services:
-                if svc.name not in frontend_names:
-                    frontend_names.append(svc.name)
-
-            # this hash is used to prevent tf errors
-            # in the event of a major infra change
-            # (e.g. switching from a frontend only app to a backend only app)
-            #
-            # when the hash changes, it forces creation of a new
-            # cloudfront dist instead of updating an existing one in place
-            fe_hash = base64.b64encode("".join(frontend_names).encode()).decode()
-            fe_hash = re.sub("\\W", "", fe_hash)
-        else:
-            fe_hash = ""
-
-        return {
-            "re": re,
-            "output_only": self.output_only,
-            "app": self.application,
-            "env_collection": self.collection,
-            "config_renderer": self,
-            "frontend_hash": fe_hash,
-            "svc_path_lambda": lambda svc: len(svc.settings.url_path),
-            "sorted": sorted,
-            "has_postgres_db": [
-                True
-                for r in self.collection.database_resources
-                if r.settings.engine == "postgres"
-            ],
-            "has_mysql_db": [
-                True
-                for r in self.collection.database_resources
-                if r.settings.engine == "mysql"
-            ],
-            "has_mssql_db": [
-                True
-                for r in self.collection.database_resources
-                if "sqlserver" in r.settings.engine
-            ],
-            "os_env": os.environ,
-        }
-
-    def copy_templates(self, working_dir=None):
-        self.copy_template_dir(working_dir=working_dir)
+        return LazyTemplateContext(
+            {
+                "re": re,
+                "output_only": self.output_only,
+                "app": self.application,
+                "env_collection": self.collection,
+                "config_renderer": self,
+                "svc_path_lambda": lambda svc: len(svc.settings.url_path),
+                "sorted": sorted,
+                "os_env": os.environ,
+            },
+            # only computed for templates that use them
+            lazy={
+                "frontend_hash": self.frontend_hash,
+                "has_postgres_db": lambda: [
+                    True
+                    for r in self.collection.database_resources
+                    if r.settings.engine == "postgres"
+                ],
+                "has_mysql_db": lambda: [
+                    True
+                    for r in self.collection.database_resources
+                    if r.settings.engine == "mysql"
+                ],
+                "has_mssql_db": lambda: [
+                    True
+                    for r in self.collection.database_resources
+                    if "sqlserver" in r.settings.engine
+                ],
+            },
+        )
+
+    def frontend_hash(self):
+        if not self.application.provider_is_aws:
+            return ""
 
+        frontend_names = []
+        for svc in self.collection.frontend_services:
+            if svc.name not in frontend_names:
+                frontend_names.append(svc.name)
+
+        # this hash is used to prevent tf errors
+        # in the event of a major infra change
+        # (e.g. switching from a frontend only app to a backend only app)
+        #
+        # when the hash changes, it forces creation of a new
+        # cloudfront dist instead of updating an existing one in place
+        fe_hash = base64.b64encode("".join(frontend_names).encode()).decode()
+        return re.sub("\\W", "", fe_hash)
+
+    def materialize_assets(self):
         if not self.output_only:
-            self.collection.generate_tf_assets(
-                self.config_files_path, self.rendered_files_path
-            )
+            self.collection.generate_tf_assets(self)
+
+        return True
 
     @property
     def config_files_path(self):
@@ -220,6 +227,8 @@ class ProvisionStageManager(CollectionTemplatedBase):
         return self._return_true_if_successful(_ret)
 
     def parse_config_file(self, tfconfig="main.tf"):
+        import pygohcl
+
         with open(f"{self.rendered_files_path}/{tfconfig}", "r") as f:
             parsed = pygohcl.loads(f.read())
         return parsed
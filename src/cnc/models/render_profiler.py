@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+from contextlib import contextmanager
+from functools import cached_property
+
+from cnc.utils.cache import env_flag
+from cnc.logger import get_logger
+
+log = get_logger(__name__)
+
+# model methods counted alongside properties
+PROFILED_METHODS = ["get_terraform_output", "infra_outputs", "get_secret_value"]
+
+
+def profiled_models():
+    """Models (and their subclasses) whose attribute accesses are counted"""
+    from cnc.models import (
+        Application,
+        Environment,
+        EnvironmentCollection,
+        EnvironmentVariable,
+    )
+    from cnc.models.config.service import Service
+
+    return [
+        Application,
+        EnvironmentCollection,
+        Environment,
+        Service,
+        EnvironmentVariable,
+    ]
+
+
+class RenderProfiler:
+    """
+    Opt-in profiler for template rendering (CNC_PROFILE_RENDER=1 or
+    --profile-render). Records wall time & call counts per template and
+    render_template partial, how often model properties are accessed
+    while rendering and hit/miss counts for render memos.
+
+    Results are printed as a table when the process exits, or written as
+    JSON to CNC_PROFILE_RENDER_OUTPUT if set. Model classes are patched
+    on the first profiled render and restored once the results are
+    reported (or the profiler is disabled).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reported = False
+        self.timings = {}
+        self.accesses = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patched = []
+        self._instrumented = False
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def rendering(self):
+        return self.enabled and bool(self._stack)
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        # models are instrumented on first render, once they're all defined
+        self.enabled = True
+        atexit.register(self.report)
+
+    def disable(self):
+        self.enabled = False
+        self.restore_models()
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.accesses = {}
+            self.caches = {}
+        self.reported = False
+
+    def _record(self, kind, name, seconds, self_seconds):
+        with self._lock:
+            timing = self.timings.setdefault(
+                (kind, name), {"calls": 0, "seconds": 0.0, "self_seconds": 0.0}
+            )
+            timing["calls"] += 1
+            timing["seconds"] += seconds
+            timing["self_seconds"] += self_seconds
+
+    @contextmanager
+    def template(self, name):
+        """Times a write_template call (nested ones are partials)"""
+        if not self.enabled:
+            yield
+            return
+
+        if not self._instrumented:
+            self.instrument_models()
+
+        kind = "partial" if self._stack else "template"
+        # child time is subtracted to get self time
+        frame = [0.0]
+        self._stack.append(frame)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += seconds
+            self._record(kind, name, seconds, seconds - frame[0])
+
+    def count_access(self, name):
+        if not self.rendering:
+            return
+
+        with self._lock:
+            self.accesses[name] = self.accesses.get(name, 0) + 1
+
+    def count_cache(self, name, hit):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            stats = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    def instrument_models(self):
+        with self._lock:
+            if self._instrumented:
+                return
+            self._instrumented = True
+
+        def subclasses(cls):
+            yield cls
+            for subclass in cls.__subclasses__():
+                yield from subclasses(subclass)
+
+        classes = {cls for model in profiled_models() for cls in subclasses(model)}
+        for cls in classes:
+            for attr_name, attr in list(vars(cls).items()):
+                name = f"{cls.__name__}.{attr_name}"
+                if isinstance(attr, property):
+                    wrapped = self._counted_property(name, attr)
+                elif isinstance(attr, cached_property):
+                    wrapped = self._counted_cached_property(name, attr)
+                elif attr_name in PROFILED_METHODS and callable(attr):
+                    wrapped = self._counted_method(name, attr)
+                else:
+                    continue
+
+                setattr(cls, attr_name, wrapped)
+                self._patched.append((cls, attr_name, attr))
+
+    def restore_models(self):
+        with self._lock:
+            patched, self._patched = self._patched, []
+            self._instrumented = False
+
+        for cls, name, original in reversed(patched):
+            setattr(cls, name, original)
+
+    def _counted_property(self, name, prop):
+        def fget(instance):
+            self.count_access(name)
+            return prop.fget(instance)
+
+        return property(fget, prop.fset, prop.fdel, prop.__doc__)
+
+    def _counted_cached_property(self, name, cached):
+        # a property (a data descriptor) sees every access, not just the
+        # first one, the value is still computed & cached by cached
+        def fget(instance):
+            self.count_access(name)
+            return cached.__get__(instance, type(instance))
+
+        def fset(instance, value):
+            instance.__dict__[cached.attrname] = value
+
+        return property(fget, fset, doc=cached.__doc__)
+
+    def _counted_method(self, name, method):
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            self.count_access(name)
+            return method(*args, **kwargs)
+
+        return counted
+
+    def as_dict(self):
+        with self._lock:
+            timings = [
+                {"kind": kind, "name": name, **timing}
+                for (kind, name), timing in self.timings.items()
+            ]
+            accesses = dict(self.accesses)
+            caches = {name: dict(stats) for name, stats in self.caches.items()}
+
+        return {
+            "templates": sorted(timings, key=lambda t: t["self_seconds"], reverse=True),
+            "model_accesses": dict(
+                sorted(accesses.items(), key=lambda a: a[1], reverse=True)
+            ),
+            "caches": caches,
+        }
+
+    def report(self, output_path=None):
+        if not self.enabled or self.reported:
+            return
+
+        self.reported = True
+        self.restore_models()
+        results = self.as_dict()
+
+        output_path = output_path or os.environ.get("CNC_PROFILE_RENDER_OUTPUT")
+        if output_path:
+            with open(output_path, "w") as f:
+                json.dump(results, f, indent=2)
+            log.info(f"Wrote render profile to {output_path}")
+            return
+
+        from tabulate import tabulate
+
+        print(
+            tabulate(
+                [
+                    [
+                        t["kind"],
+                        t["name"],
+                        t["calls"],
+                        f"{t['seconds']:.4f}",
+                        f"{t['self_seconds']:.4f}",
+                    ]
+                    for t in results["templates"]
+                ],
+                ["kind", "name", "calls", "total (s)", "self (s)"],
+                tablefmt="grid",
+            )
+        )
+        print(
+            tabulate(
+                list(results["model_accesses"].items()),
+                ["model attribute", "accesses"],
+                tablefmt="grid",
+            )
+        )
+        if results["caches"]:
+            print(
+                tabulate(
+                    [
+                        [name, stats["hits"], stats["misses"]]
+                        for name, stats in results["caches"].items()
+                    ],
+                    ["cache", "hits", "misses"],
+                    tablefmt="grid",
+                )
+            )
+        sys.stdout.flush()
+
+
+profiler = RenderProfiler()
+
+if env_flag("CNC_PROFILE_RENDER"):
+    profiler.enable()
@@ -0,0 +1,345 @@
+import os
+import json
+import typing
+import hashlib
+from functools import lru_cache, partial
+from importlib import metadata
+
+from pydantic import BaseModel as PydanticBaseModel
+
+from .base_model import IgnoredType
+from .config import AppConfig
+from cnc.utils.cache import env_flag, cache_directory, is_private
+from cnc.utils.files import AtomicWriter
+
+from cnc.logger import get_logger
+
+log = get_logger(__name__)
+
+# bump when the snapshot layout changes
+SNAPSHOT_FORMAT = 2
+
+_cnc_version = None
+
+
+def snapshot_cache_dir():
+    """
+    Opt-in with CNC_SNAPSHOT_CACHE=1 (uses ~/.cache/cnc/snapshots)
+    or by pointing CNC_SNAPSHOT_CACHE_DIR at a directory
+    """
+    cache_dir = os.environ.get("CNC_SNAPSHOT_CACHE_DIR")
+    if not (cache_dir or env_flag("CNC_SNAPSHOT_CACHE")):
+        return None
+
+    return cache_dir or cache_directory("snapshots")
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cnc_version():
+    """
+    Installed cnc version plus the state of the package sources (models,
+    utils, flavor templates & metadata), so editing a checkout doesn't
+    load snapshots made by the old code
+    """
+    global _cnc_version
+
+    if _cnc_version is None:
+        try:
+            version = metadata.version("cocnc")
+        except metadata.PackageNotFoundError:
+            version = "dev"
+
+        package_dir = os.path.dirname(os.path.dirname(__file__))
+        sources = []
+        for dirpath, dirnames, filenames in os.walk(package_dir):
+            dirnames[:] = sorted(
+                d for d in dirnames if d not in ["__pycache__", "tests"]
+            )
+            for filename in sorted(filenames):
+                stat_result = os.stat(os.path.join(dirpath, filename))
+                sources.append(
+                    f"{dirpath}/{filename}:"
+                    f"{stat_result.st_mtime_ns}:{stat_result.st_size}"
+                )
+
+        sources_hash = hashlib.sha256("\n".join(sources).encode()).hexdigest()
+        _cnc_version = f"{version}:{sources_hash}"
+
+    return _cnc_version
+
+
+def snapshot_path(cache_dir, data_file_path, config_file_path, lazy=False):
+    # relative config_file_paths in environments.yml resolve against the cwd
+    key = ":".join(
+        [
+            str(SNAPSHOT_FORMAT),
+            cnc_version(),
+            os.getcwd(),
+            os.path.realpath(config_file_path),
+            file_digest(data_file_path),
+            str(lazy),
+        ]
+    )
+    return os.path.join(cache_dir, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+
+# ------------------------------
+# Model graph <-> plain data
+# ------------------------------
+def is_parent_link(model, name):
+    if isinstance(model, AppConfig) and name == "environment":
+        return True
+
+    annotation = model.model_fields[name].annotation
+    return annotation is IgnoredType or IgnoredType in typing.get_args(annotation)
+
+
+def model_data(model):
+    """
+    Field values of model as plain data, without parent links. Fields left
+    at a default that isn't a model (defaults aren't validated, e.g. {} for
+    a model field) are listed under "__defaults__" and restored as they are.
+    """
+    data = {"__defaults__": []}
+    for name in model.model_fields:
+        if is_parent_link(model, name):
+            continue
+
+        value = getattr(model, name)
+        if name not in model.model_fields_set:
+            if not isinstance(value, PydanticBaseModel):
+                data["__defaults__"].append(name)
+        elif name == "config_data":
+            # set to the environment itself, see Environment.ensure_config_data
+            value = {k: v for k, v in value.items() if k != "environment"}
+
+        data[name] = plain_data(value)
+
+    return data
+
+
+def plain_data(value):
+    if isinstance(value, PydanticBaseModel):
+        return model_data(value)
+    if isinstance(value, (list, tuple)):
+        return [plain_data(item) for item in value]
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError(f"Cannot snapshot non-string keys: {list(value)}")
+        return {key: plain_data(item) for key, item in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    raise TypeError(f"Cannot snapshot {type(value).__name__} value")
+
+
+def is_model_class(annotation):
+    return isinstance(annotation, type) and issubclass(annotation, PydanticBaseModel)
+
+
+def discriminator_values(member, discriminator):
+    """Values of discriminator that select member (a class or Annotated union)"""
+    if typing.get_origin(member) is typing.Annotated:
+        union = typing.get_args(member)[0]
+        return [
+            value
+            for nested_member in typing.get_args(union)
+            for value in discriminator_values(nested_member, discriminator)
+        ]
+
+    for name, field in member.model_fields.items():
+        if discriminator in [name, field.alias]:
+            return [(name, value) for value in typing.get_args(field.annotation)]
+
+    return []
+
+
+@lru_cache(maxsize=None)
+def value_builder(annotation, discriminator=None):
+    """
+    Function that turns model_data output back into values of annotation,
+    or None if the plain data is the value. Built once per annotation.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return value_builder(args[0], args[1].discriminator)
+
+    if origin is typing.Union:
+        args = tuple(arg for arg in args if arg is not type(None))
+        if len(args) == 1:
+            return value_builder(args[0], discriminator)
+
+        members = [
+            member
+            for member in args
+            if typing.get_origin(member) is typing.Annotated or is_model_class(member)
+        ]
+        if not members:
+            return None
+
+        if not discriminator:
+            if len(members) > 1:
+                raise TypeError(f"Cannot snapshot undiscriminated {annotation}")
+            return value_builder(members[0])
+
+        builders = {
+            key: value_builder(member)
+            for member in members
+            for key in discriminator_values(member, discriminator)
+        }
+        # every member has the same discriminator field
+        field_name = next(iter(builders))[0]
+        return lambda value: builders[(field_name, value.get(field_name))](value)
+
+    if origin is list:
+        item_builder = value_builder(args[0])
+        if item_builder is None:
+            return None
+        return lambda value: [item_builder(item) for item in value]
+
+    if origin is dict and args:
+        item_builder = value_builder(args[1])
+        if item_builder is None:
+            return None
+        return lambda value: {key: item_builder(item) for key, item in value.items()}
+
+    if is_model_class(annotation):
+        return partial(construct_model, annotation)
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def field_builders(model_class):
+    return {
+        name: value_builder(field.annotation, field.discriminator)
+        for name, field in model_class.model_fields.items()
+    }
+
+
+def construct_model(model_class, data):
+    """
+    model_class from model_data output, without running any validators
+    (the data was validated when the snapshot was made)
+    """
+    defaults = data.pop("__defaults__")
+    builders = field_builders(model_class)
+    for name, value in data.items():
+        builder = builders[name]
+        if builder is not None and value is not None and name not in defaults:
+            data[name] = builder(value)
+
+    return model_class.model_construct(set(data) - set(defaults), **data)
+
+
+def snapshot_data(application):
+    """
+    The application's validated data plus each loaded AppConfig, stored
+    once per config fingerprint (see Environment.load_config)
+    """
+    configs = {}
+    environments = []
+    for environment in application.environments:
+        fingerprint = None
+        if environment.config_loaded:
+            fingerprint = environment.config_fingerprint()
+            if not fingerprint:
+                raise TypeError(f"Cannot snapshot config of {environment.name}")
+            if fingerprint not in configs:
+                configs[fingerprint] = model_data(environment.loaded_config)
+
+        environments.append(fingerprint)
+
+    return {
+        "application": model_data(application),
+        "configs": configs,
+        "environments": environments,
+    }
+
+
+def application_from_snapshot(application_class, data):
+    application = construct_model(application_class, data["application"])
+    application.link_children()
+
+    for environment, fingerprint in zip(application.environments, data["environments"]):
+        environment.config_data["environment"] = environment
+        if not fingerprint:
+            continue
+
+        shared_config = application.shared_configs.get(fingerprint)
+        if shared_config is None:
+            config = construct_model(AppConfig, data["configs"][fingerprint])
+            config.environment = environment
+            application.shared_configs[fingerprint] = config.link_children()
+        else:
+            config = shared_config.copy_for(environment)
+
+        environment.loaded_config = config
+
+    return application
+
+
+# ------------------------------
+# Files
+# ------------------------------
+def load_snapshot(path, application_class):
+    """
+    Returns the application stored at path, or None if there isn't one
+    or any cnc.yml it was validated with has changed since
+    """
+    try:
+        if not (is_private(os.path.dirname(path)) and is_private(path)):
+            log.warning(f"Ignoring snapshot {path} writable by other users")
+            return None
+
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+    for dependency_path, digest in data["dependencies"].items():
+        try:
+            if file_digest(dependency_path) != digest:
+                return None
+        except OSError:
+            return None
+
+    try:
+        application = application_from_snapshot(application_class, data)
+    except Exception as e:
+        log.warning(f"Ignoring invalid snapshot {path}: {e}")
+        return None
+
+    log.debug(f"Loaded application snapshot {path}")
+    return application
+
+
+def save_snapshot(path, application):
+    config_file_paths = {
+        os.path.realpath(environment.config_file_path)
+        for environment in application.environments
+        if environment.config_file_path
+    }
+
+    try:
+        data = {
+            "dependencies": {
+                config_file_path: file_digest(config_file_path)
+                for config_file_path in config_file_paths
+            },
+            **snapshot_data(application),
+        }
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with AtomicWriter(path) as f:
+            f.write(json.dumps(data))
+    except Exception as e:
+        log.warning(f"Cannot save application snapshot {path}: {e}")
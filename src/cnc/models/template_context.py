@@ -0,0 +1,105 @@
+from collections.abc import MutableMapping
+
+from jinja2 import meta
+
+# (template name, source) -> (names it looks up, templates it references)
+_parsed_templates = {}
+
+
+class LazyTemplateContext(MutableMapping):
+    """
+    Template context where expensive values are callables that only get
+    evaluated (once) when looked up. Keeps track of the lazy keys that were
+    looked up so unused ones can be spotted.
+    """
+
+    def __init__(self, values=None, lazy=None):
+        self.values = dict(values or {})
+        self.lazy = dict(lazy or {})
+        self.lazy_keys = set(self.lazy)
+        self.accessed_keys = set()
+
+    def __getitem__(self, key):
+        if key in self.lazy:
+            self.values[key] = self.lazy.pop(key)()
+
+        value = self.values[key]
+        if key in self.lazy_keys:
+            self.accessed_keys.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.lazy.pop(key, None)
+        self.lazy_keys.discard(key)
+        self.values[key] = value
+
+    def __delitem__(self, key):
+        self.lazy_keys.discard(key)
+        if key in self.lazy:
+            del self.lazy[key]
+        else:
+            del self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values or key in self.lazy
+
+    def __iter__(self):
+        yield from self.values
+        yield from self.lazy
+
+    def __len__(self):
+        return len(self.values) + len(self.lazy)
+
+    def __repr__(self):
+        values = dict(self.values)
+        values.update({key: "<lazy>" for key in self.lazy})
+        return f"{self.__class__.__name__}({values})"
+
+    @property
+    def unused_keys(self):
+        return self.lazy_keys - self.accessed_keys
+
+    def resolve(self, names=None):
+        """
+        Plain dict for template.generate(), with the lazy values evaluated
+        only for the given names (all of them if names is None)
+        """
+        return {
+            key: self[key]
+            for key in list(self)
+            if names is None or key not in self.lazy_keys or key in names
+        }
+
+
+def referenced_names(environment, name, _seen=None):
+    """
+    Names a template (and every template it includes, imports or extends)
+    looks up in its context, or None if a referenced template can't be
+    known up front (e.g. an include of a variable)
+    """
+    seen = _seen if _seen is not None else set()
+    if name in seen:
+        return set()
+    seen.add(name)
+
+    source = environment.loader.get_source(environment, name)[0]
+    key = (name, source)
+    if key not in _parsed_templates:
+        ast = environment.parse(source)
+        _parsed_templates[key] = (
+            set(meta.find_undeclared_variables(ast)),
+            list(meta.find_referenced_templates(ast)),
+        )
+
+    own_names, referenced_templates = _parsed_templates[key]
+    names = set(own_names)
+    for referenced in referenced_templates:
+        if referenced is None:
+            return None
+
+        referenced = referenced_names(environment, referenced, seen)
+        if referenced is None:
+            return None
+        names |= referenced
+
+    return names
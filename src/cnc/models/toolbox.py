@@ -39,8 +39,8 @@ class ToolboxManager(EnvironmentTemplatedBase):
                             del all_env_items[i]
 
                     all_env_items.append(
-                        self.environment.config.variable_object(
-                            {"name": name, "value": value}
+                        self.environment.managed_items.variable_object(
+                            name, value=value
                         )
                     )
 
@@ -62,13 +62,11 @@ class ToolboxManager(EnvironmentTemplatedBase):
         }
 
     def render_toolbox(self, command=None):
+        self.prefetch_secrets(services=[self.service])
         context = self.template_context(command=command)
         context["render_template"] = self.write_template_with_context(self.service)
         self.write_template("main.sh.j2", context=context)
 
-    def copy_templates(self, working_dir=None):
-        self.copy_template_dir(working_dir=working_dir)
-
     def start(self):
         log.debug(f"Rendering toolbox script for {self} @ {self.config_files_path}")
         self.setup()
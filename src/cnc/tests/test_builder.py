@@ -1,8 +1,14 @@
+import os
 from unittest.mock import patch
 
 from .base_test_class import CNCBaseTestCase
-from cnc.models import Application, BuildStageManager
+from cnc.models import Application, BuildStageManager, Environment
+from cnc.models.application import TemplateConfig
+from cnc.models import cycle_stage_base
+from cnc.models.cycle_stage_base import get_template_environment
+from cnc.models.render_profiler import profiler
 from cnc.models.providers.google.environment_collection import GCPEnvironmentCollection
+from cnc.utils.render import collapse_blank_lines, strip_excess_newlines
 
 
 from cnc.logger import get_logger
@@ -97,6 +103,298 @@ class BuildEnvironmentItemsTestCase(CNCBaseTestCase):
         )
 
 
+class BuildTemplateEnvironmentTestCase(CNCBaseTestCase):
+    fixture_name = "backend-2-service-1-db"
+
+    def test_templates_compiled_once(self):
+        app = Application.from_environments_yml("environments.yml")
+        environment = app.collections[0].environments[0]
+
+        builder = BuildStageManager(environment)
+        builder.cleanup()
+        builder.setup()
+        self.addCleanup(builder.cleanup)
+
+        self.assertIs(
+            get_template_environment(builder.template_search_path),
+            get_template_environment(builder.template_search_path),
+        )
+        self.assertIs(
+            builder.get_template("main.sh.j2"),
+            BuildStageManager(environment).get_template("main.sh.j2"),
+        )
+
+
+class BuildTemplateBytecodeCacheTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service"
+
+    def render(self):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(app.collections[0].environments[0])
+        builder.cleanup()
+        builder.setup()
+        self.addCleanup(builder.cleanup)
+
+        # fresh registry to simulate a new cnc invocation
+        with patch.dict(cycle_stage_base._template_environments, clear=True):
+            builder.render_build()
+
+    def test_bytecode_cache(self):
+        cache_dir = f"{self.working_dir}/.jinja-cache"
+        with patch.dict(os.environ, {"CNC_TEMPLATE_CACHE_DIR": cache_dir}):
+            self.render()
+            cached = sorted(os.listdir(cache_dir))
+            self.assertTrue(cached)
+
+            self.render()
+            self.assertEqual(sorted(os.listdir(cache_dir)), cached)
+
+        self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+
+    def test_shared_cache_dir_is_ignored(self):
+        cache_dir = f"{self.working_dir}/.jinja-cache"
+        os.makedirs(cache_dir)
+        os.chmod(cache_dir, 0o777)
+
+        with patch.dict(os.environ, {"CNC_TEMPLATE_CACHE_DIR": cache_dir}):
+            self.assertIsNone(cycle_stage_base.get_template_bytecode_cache())
+            self.render()
+
+        self.assertEqual(os.listdir(cache_dir), [])
+
+
+class BuildIncrementalRenderTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service"
+
+    def render(self):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(
+            app.collections[0].environments[0], incremental=True
+        )
+        builder.setup()
+        builder.render_build()
+        return builder
+
+    def test_unchanged_outputs_not_rewritten(self):
+        builder = self.render()
+        self.addCleanup(builder.cleanup)
+        self.assertTrue(os.path.isfile(builder.render_manifest_path))
+
+        script_path = f"{builder.rendered_files_path}/build-app.sh"
+        mtime_ns = os.stat(script_path).st_mtime_ns
+
+        self.render()
+        self.assertEqual(os.stat(script_path).st_mtime_ns, mtime_ns)
+
+        # files changed outside of cnc get rewritten
+        with open(script_path, "a") as f:
+            f.write("echo edited")
+
+        self.render()
+        with open(script_path) as f:
+            self.assertNotIn("echo edited", f.read())
+
+    def test_changed_outputs_reported(self):
+        builder = self.render()
+        self.addCleanup(builder.cleanup)
+
+        with open(f"{builder.rendered_files_path}/build-app.sh") as f:
+            self.assertFalse(builder.write_output("build-app.sh", f.read()))
+        self.assertEqual(builder.finish_render(), [])
+
+        self.assertTrue(builder.write_output("build-app.sh", "echo changed"))
+        self.assertEqual(builder.finish_render(), ["build-app.sh"])
+
+    def test_stale_outputs_pruned(self):
+        builder = self.render()
+        self.addCleanup(builder.cleanup)
+        rendered = sorted(builder.render_manifest)
+
+        # e.g. the scripts of a service that was since removed
+        builder.write_output("build-removed.sh", "echo removed")
+        builder.finish_render()
+        self.assertIn("build-removed.sh", builder.render_manifest)
+
+        builder = self.render()
+        self.assertFalse(
+            os.path.exists(f"{builder.rendered_files_path}/build-removed.sh")
+        )
+        self.assertEqual(sorted(builder.render_manifest), rendered)
+        with open(builder.render_manifest_path) as f:
+            self.assertNotIn("build-removed.sh", f.read())
+
+    def test_warn_about_cleanup(self):
+        builder = self.render()
+        self.addCleanup(builder.cleanup)
+
+        with patch.object(cycle_stage_base.log, "warning") as warning:
+            builder.check_incremental(should_cleanup=False)
+            warning.assert_not_called()
+
+            builder.check_incremental(should_cleanup=True)
+            warning.assert_called_once()
+
+
+class BuildStreamingRenderTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service"
+
+    def test_collapse_blank_lines(self):
+        text = "a\n\n  \nb \n\t\n c\n \n\nd  \n"
+        for chunk_size in [1, 2, 5, 1024]:
+            chunks = [text[i : i + 3] for i in range(0, len(text), 3)]
+            self.assertEqual(
+                "".join(collapse_blank_lines(chunks, chunk_size=chunk_size)),
+                strip_excess_newlines(text),
+            )
+
+    def test_streamed_output_matches_render(self):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(app.collections[0].environments[0])
+        builder.setup()
+        self.addCleanup(builder.cleanup)
+
+        service = builder.environment.services[0]
+        context = builder.template_context(service)
+        context["render_template"] = builder.write_template_with_context(service)
+        builder.write_template("main.sh.j2", output_name="main.sh", context=context)
+
+        rendered = builder.get_template("main.sh.j2").render(**context)
+        with open(f"{builder.rendered_files_path}/main.sh") as f:
+            self.assertEqual(f.read(), strip_excess_newlines(rendered))
+
+
+class BuildRenderWorkersTestCase(CNCBaseTestCase):
+    fixture_name = "backend-2-service-1-db"
+
+    def render(self, render_workers, incremental=False, cleanup=True):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(
+            app.collections[0].environments[0],
+            render_workers=render_workers,
+            incremental=incremental,
+        )
+        if cleanup:
+            builder.cleanup()
+        builder.setup()
+        self.addCleanup(builder.cleanup)
+
+        with patch.object(
+            GCPEnvironmentCollection, "get_secret_value", return_value="secretvalue"
+        ):
+            builder.render_build()
+        self.builder = builder
+
+        rendered = {}
+        for script in sorted(os.listdir(builder.rendered_files_path)):
+            with open(f"{builder.rendered_files_path}/{script}") as f:
+                rendered[script] = f.read()
+
+        return builder.scripts_to_run, rendered
+
+    def test_concurrent_render_matches_sequential(self):
+        self.assertEqual(self.render(render_workers=4), self.render(render_workers=1))
+
+    def test_concurrent_incremental_render(self):
+        sequential = self.render(render_workers=1)
+
+        self.assertEqual(self.render(render_workers=4, incremental=True), sequential)
+        manifest = self.builder.render_manifest
+        self.assertEqual(sorted(manifest), sorted(sequential[1]))
+
+        def mtimes():
+            return {
+                script: os.stat(
+                    f"{self.builder.rendered_files_path}/{script}"
+                ).st_mtime_ns
+                for script in sequential[1]
+            }
+
+        before = mtimes()
+        self.assertEqual(
+            self.render(render_workers=4, incremental=True, cleanup=False),
+            sequential,
+        )
+        # nothing changed, so nothing was rewritten or pruned
+        self.assertEqual(mtimes(), before)
+        self.assertEqual(self.builder.render_manifest, manifest)
+
+    def test_errors_collected_per_service(self):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(
+            app.collections[0].environments[0], render_workers=4
+        )
+        services = builder.services_to_render()
+
+        def render_service(service):
+            if service.name == services[0].name:
+                raise ValueError("broken template")
+            return service.name
+
+        with self.assertRaises(Exception) as e:
+            builder.render_services(render_service, services)
+
+        self.assertIn(services[0].name, str(e.exception))
+        self.assertIsInstance(e.exception.__cause__, ValueError)
+        self.assertEqual(
+            builder.render_services(lambda service: service.name, services),
+            [service.name for service in services],
+        )
+
+
+class BuildRenderProfilerTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service"
+
+    def setUp(self):
+        super().setUp()
+        profiler.enable()
+        self.addCleanup(profiler.reset)
+        self.addCleanup(profiler.disable)
+
+    def test_render_profile(self):
+        app = Application.from_environments_yml("environments.yml")
+        builder = BuildStageManager(app.collections[0].environments[0])
+        builder.cleanup()
+        builder.setup()
+        self.addCleanup(builder.cleanup)
+        builder.render_build()
+
+        results = profiler.as_dict()
+        profiled = {(t["kind"], t["name"]): t for t in results["templates"]}
+        self.assertEqual(profiled[("template", "main.sh.j2")]["calls"], 1)
+        self.assertEqual(profiled[("template", "build_functions.sh.j2")]["calls"], 1)
+        self.assertTrue(
+            any(kind == "partial" for kind, _name in profiled),
+        )
+        self.assertIn("Service.environment_items", results["model_accesses"])
+
+        output_path = f"{self.working_dir}/profile.json"
+        profiler.report(output_path=output_path)
+        self.assertTrue(os.path.isfile(output_path))
+
+    def test_only_profiled_models_patched_until_reported(self):
+        app = Application.from_environments_yml("environments.yml")
+        environment = app.collections[0].environments[0]
+        instance_name = vars(Environment)["instance_name"]
+        template_config_attrs = dict(vars(TemplateConfig))
+
+        with profiler.template("main.sh.j2"):
+            self.assertIsNot(vars(Environment)["instance_name"], instance_name)
+            self.assertEqual(vars(TemplateConfig), template_config_attrs)
+
+            # cached properties are counted on every access
+            for _ in range(3):
+                self.assertEqual(
+                    environment.instance_name, instance_name.func(environment)
+                )
+
+        self.assertEqual(
+            profiler.as_dict()["model_accesses"]["Environment.instance_name"], 3
+        )
+
+        profiler.report(output_path=f"{self.working_dir}/profile.json")
+        self.assertIs(vars(Environment)["instance_name"], instance_name)
+
+
 class GCPBuildStageTestBase(CNCBaseTestCase):
     fixture_name = "backend-1-service-1-db"
     environment_name = "main"
@@ -1,6 +1,7 @@
 import yaml
 from .base_test_class import CNCBaseTestCase
 from cnc.models import Application, DeployStageManager
+from cnc.models.render_profiler import profiler
 
 
 from cnc.logger import get_logger
@@ -89,3 +90,24 @@ class AWSDeployStageSmokeTest(AWSDeployStageTestBase):
         for service in self.environment.web_services:
             web_task = self.parse(f"ecs-web-{service.name}.json")
             self.assertIn(service.instance_name, web_task)
+
+
+class AWSDeployInsecureItemsMemoTest(AWSDeployStageTestBase):
+    fixture_name = "backend-1-service-1-worker-1-task"
+
+    def setUp(self):
+        profiler.enable()
+        self.addCleanup(profiler.reset)
+        self.addCleanup(profiler.disable)
+        super().setUp()
+
+    def test_insecure_items_memoized_per_run(self):
+        # the web task, worker and scheduled task json all list them
+        stats = profiler.as_dict()["caches"]["Service.insecure_environment_items"]
+        self.assertEqual(stats["misses"], 1)
+        self.assertGreaterEqual(stats["hits"], 2)
+
+        service = self.environment.services[0]
+        self.assertIn("_insecure_environment_items", service.__dict__)
+        self.deployer.setup()
+        self.assertNotIn("_insecure_environment_items", service.__dict__)
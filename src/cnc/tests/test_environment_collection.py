@@ -21,6 +21,75 @@ class EnvironmentCollectionTestCase(EnvironmentCollectionBaseTestCase):
         self.assertIsNone(self.collection.environment_by_name("foo"))
         self.assertIsNotNone(self.collection.environment_by_name("main"))
 
+    def test_lookups_by_name_follow_changes(self):
+        environment = self.collection.environment_by_name("main")
+        self.assertIs(environment, self.collection.environments[0])
+        self.assertIs(
+            self.collection.application.collection_by_name(self.collection.name),
+            self.collection,
+        )
+        self.assertIs(environment.service_by_name("app"), environment.services[0])
+        self.assertIsNone(environment.service_by_name("foo"))
+
+        variable = environment.variable_by_name("CNC_ENVIRONMENT_NAME")
+        self.assertEqual(variable.value, "main")
+
+        # appended to the list
+        copy = environment.model_copy(update={"name": "copy"})
+        self.collection.environments.append(copy)
+        self.assertIs(self.collection.environment_by_name("copy"), copy)
+
+        # changed in place
+        copy.name = "renamed"
+        self.assertIs(self.collection.environment_by_name("copy"), copy)
+        self.collection.invalidate_caches()
+        self.assertIsNone(self.collection.environment_by_name("copy"))
+        self.assertIs(self.collection.environment_by_name("renamed"), copy)
+
+
+class EnvironmentCollectionParentLinksTestCase(EnvironmentCollectionBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_parent_links(self):
+        for lazy in [False, True]:
+            app = Application.from_environments_yml(self.env_data_filepath, lazy=lazy)
+            collection = app.collections[0]
+            self.assertIs(collection.application, app)
+
+            for environment in collection.environments:
+                self.assertIs(environment.application, app)
+                self.assertIs(environment.collection, collection)
+
+                for variable in environment.environment_variables:
+                    self.assertIs(variable.environment, environment)
+                    self.assertIs(variable.collection, collection)
+
+                for service in environment.services:
+                    self.assertIs(service.environment, environment)
+                    self.assertIs(service.config, environment.config)
+                    self.assertIs(service.settings.service, service)
+                    self.assertIs(service.settings.config, environment.config)
+
+
+class EnvironmentCollectionUniqueIdTestCase(EnvironmentCollectionBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_unique_id_ignores_config_loading(self):
+        unique_id = self.collection.unique_id
+
+        app = Application.from_environments_yml(self.env_data_filepath, lazy=True)
+        collection = app.collections[0]
+        main, other = collection.environments
+        self.assertEqual(collection.unique_id, unique_id)
+
+        main.config
+        collection.invalidate_caches()
+        self.assertEqual(collection.unique_id, unique_id)
+
+        other.config
+        collection.invalidate_caches()
+        self.assertEqual(collection.unique_id, unique_id)
+
 
 class EnvironmentCollectionExistingDBTestCase(EnvironmentCollectionBaseTestCase):
     fixture_name = "backend-1-service-1-db-use-existing"
@@ -52,6 +121,30 @@ class EnvironmentCollectionTwoServicesandDBsTwoEnvsTest(
         self.assertEqual(len(self.collection.all_services_for_type("frontend")), 0)
         self.assertEqual(len(self.collection.all_services_for_type("cache")), 0)
 
+    def test_services_by_type_index(self):
+        services = sorted(
+            [s for e in self.collection.environments for s in e.services],
+            key=lambda s: s.settings.unique_id,
+        )
+        self.assertEqual(self.collection.all_services, services)
+        self.assertEqual(
+            self.collection.database_resources,
+            [s for s in services if s.settings.type == "database"],
+        )
+        self.assertEqual(
+            self.collection.all_web_services,
+            [s for s in services if s.settings.type == "backend"],
+        )
+
+        # callers get their own list
+        self.collection.backend_services.clear()
+        self.assertEqual(len(self.collection.backend_services), 2)
+
+        self.collection.environments[1].paused = True
+        self.assertEqual(len(self.collection.backend_services), 2)
+        self.collection.invalidate_caches()
+        self.assertEqual(len(self.collection.backend_services), 1)
+
 
 class EnvironmentCollectionRegionSettings(EnvironmentCollectionBaseTestCase):
     fixture_name = "backend-1-service-2-db-2-envs"
@@ -61,3 +154,35 @@ class EnvironmentCollectionRegionSettings(EnvironmentCollectionBaseTestCase):
         self.assertEqual(self.collection.region, self.collection.collection_region)
         self.assertEqual(self.collection.region, "us-west2")
         self.assertEqual(self.collection.application.region, "us-east1")
+
+
+class EnvironmentCollectionIdentityTestCase(EnvironmentCollectionBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_identity_values_are_cached_until_invalidated(self):
+        environment = self.collection.environments[0]
+        service = environment.services[0]
+        variable = environment.environment_variables[0]
+
+        names = (
+            self.collection.unique_id,
+            self.collection.instance_name,
+            environment.instance_name,
+            service.instance_name,
+            variable.instance_name,
+        )
+
+        self.collection.name = "renamed"
+        self.assertEqual(self.collection.instance_name, names[1])
+        self.assertEqual(service.instance_name, names[3])
+
+        self.collection.application.invalidate_caches()
+        new_names = (
+            self.collection.unique_id,
+            self.collection.instance_name,
+            environment.instance_name,
+            service.instance_name,
+            variable.instance_name,
+        )
+        for name, new_name in zip(names, new_names):
+            self.assertNotEqual(name, new_name)
@@ -1,4 +1,5 @@
 from unittest.mock import patch
+import yaml
 
 from .base_test_class import CNCBaseTestCase
 from cnc.models import Application
@@ -59,3 +60,115 @@ class EnvironmentVariablesTestCase(CNCBaseTestCase):
 
         # check that there are no dupe names
         self.assertEqual(len(item_names), len(set(item_names)))
+
+    def test_alias_chains(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        variables = data["collections"][0]["environments"][0]["environment_variables"]
+        variables += [
+            {"name": "foo-secret-alias-alias", "alias": "foo-secret-alias"},
+            {"name": "foo-output-alias-alias", "alias": "foo-output-alias"},
+            {"name": "db-password-alias", "alias": "DB_PASSWORD"},
+        ]
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        environment = (
+            Application.from_environments_yml("environments.yml")
+            .collections[0]
+            .environments[0]
+        )
+
+        self.assertEqual(
+            environment.variable_by_name("foo-secret-alias-alias").secret_id, "bar123"
+        )
+        self.assertEqual(
+            environment.variable_by_name("foo-output-alias-alias").output_name,
+            "bar123-a",
+        )
+        self.assertEqual(
+            environment.variable_by_name("db-password-alias").value,
+            environment.variable_by_name("DB_PASSWORD").value,
+        )
+
+    def test_alias_value_prefers_managed_items(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        variables = data["collections"][0]["environments"][0]["environment_variables"]
+        variables += [
+            {"name": "CNC_ENVIRONMENT_NAME", "value": "user-value"},
+            {"name": "environment-name-alias", "alias": "CNC_ENVIRONMENT_NAME"},
+        ]
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        environment = (
+            Application.from_environments_yml("environments.yml")
+            .collections[0]
+            .environments[0]
+        )
+
+        self.assertEqual(
+            environment.variable_by_name("CNC_ENVIRONMENT_NAME").value, "user-value"
+        )
+        self.assertEqual(
+            environment.variable_by_name("environment-name-alias").value, "main"
+        )
+
+    def test_alias_cycle(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        variables = data["collections"][0]["environments"][0]["environment_variables"]
+        variables += [
+            {"name": "foo-cycle-a", "alias": "foo-cycle-b"},
+            {"name": "foo-cycle-b", "alias": "foo-cycle-a"},
+        ]
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        with self.assertRaisesRegex(
+            ValueError, "Alias cycle .* foo-cycle-a -> foo-cycle-b -> foo-cycle-a"
+        ):
+            Application.from_environments_yml("environments.yml")
+
+    def test_filtered_environment_items(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        variables = data["collections"][0]["environments"][0]["environment_variables"]
+        variables.insert(1, {"name": "foo-app-only", "value": "a", "service": "app"})
+        variables.append({"name": "foo-other-only", "value": "b", "service": "other"})
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        config = (
+            Application.from_environments_yml("environments.yml")
+            .collections[0]
+            .environments[0]
+            .config
+        )
+
+        def names(**kwargs):
+            return [v.name for v in config.filtered_environment_items(**kwargs)]
+
+        self.assertEqual(
+            names(service_name="app", variable_type="standard"),
+            ["foo-standard", "foo-app-only", "foo-standard-alias"],
+        )
+        self.assertEqual(
+            names(service_name="other", variable_type="standard"),
+            ["foo-standard", "foo-standard-alias", "foo-other-only"],
+        )
+        self.assertEqual(
+            names(variable_type="secret"), ["foo-secret", "foo-secret-alias"]
+        )
+        self.assertEqual(
+            names(service_name="app", pattern="foo-.*-only"), ["foo-app-only"]
+        )
+        self.assertEqual(len(names()), 8)
+
+        with self.assertRaises(ValueError):
+            config.filtered_environment_items(variable_type="foo")
@@ -1,5 +1,12 @@
+import os
+import json
+from unittest.mock import patch
+import yaml
+
 from .base_test_class import CNCBaseTestCase
-from cnc.models import Application
+from cnc.models import Application, BuildStageManager, DeployStageManager
+from cnc.models.providers.google.environment_collection import GCPEnvironmentCollection
+from cnc.utils.yaml_io import ordered_load, ordered_dump, safe_load
 
 from cnc.logger import get_logger
 
@@ -48,3 +55,276 @@ class EnvironmentCollectionTwoServicesandDBsTwoEnvsTest(EnvironmentBaseTestCase)
     def test_environment_services(self):
         self.assertEqual(len(self.environment.services), 3)
         self.assertEqual(len(self.environment.web_services), 1)
+
+
+class EnvironmentConfigDataCacheTestCase(EnvironmentBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_config_data_is_not_shared(self):
+        main, other = self.collection.environments
+        self.assertEqual(main.config_file_path, other.config_file_path)
+        self.assertIsNot(main.config_data, other.config_data)
+        self.assertIsNot(main.config_data["services"], other.config_data["services"])
+        self.assertIs(main.config_data["environment"], main)
+        self.assertIs(other.config_data["environment"], other)
+
+    def test_changed_config_file_is_reloaded(self):
+        with open("cnc.yml") as f:
+            data = yaml.safe_load(f)
+
+        data["services"]["db1"]["image"] = "postgres:16"
+        with open("cnc.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        app = Application.from_environments_yml("environments.yml")
+        environment = app.collections[0].environments[0]
+        self.assertEqual(
+            environment.config_data["services"]["db1"]["image"], "postgres:16"
+        )
+
+
+class EnvironmentsYmlRoundTripTestCase(EnvironmentBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_ordered_round_trip(self):
+        with open("environments.yml") as f:
+            original = f.read()
+
+        environments = ordered_load(original)
+        dumped = ordered_dump(environments)
+
+        self.assertEqual(ordered_load(dumped), environments)
+        self.assertEqual(list(ordered_load(dumped)), list(safe_load(original)))
+        self.assertEqual(safe_load(dumped), safe_load(original))
+
+
+class ApplicationSnapshotTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.dict(
+            os.environ, {"CNC_SNAPSHOT_CACHE_DIR": f"{self.working_dir}/snapshots"}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_skips_validation(self):
+        app = Application.from_environments_yml("environments.yml")
+
+        with patch.object(Application, "model_validate") as model_validate:
+            cached_app = Application.from_environments_yml("environments.yml")
+            model_validate.assert_not_called()
+
+        self.assertIsNot(cached_app, app)
+        self.assertEqual(
+            [e.name for e in cached_app.environments],
+            [e.name for e in app.environments],
+        )
+
+        environment = cached_app.collections[0].environments[0]
+        self.assertIs(environment.collection, cached_app.collections[0])
+        self.assertIs(environment.application, cached_app)
+        self.assertIs(environment.services[0].environment, environment)
+        self.assertEqual(environment.domain, app.collections[0].environments[0].domain)
+
+    def test_snapshot_is_plain_data(self):
+        app = Application.from_environments_yml("environments.yml")
+        (snapshot_file,) = os.listdir("snapshots")
+        with open(f"snapshots/{snapshot_file}") as f:
+            data = json.load(f)
+
+        self.assertEqual(len(data["configs"]), 1)
+        cached_app = Application.from_environments_yml("environments.yml")
+        for environment, cached_environment in zip(
+            app.environments, cached_app.environments
+        ):
+            self.assertIs(cached_environment.config.environment, cached_environment)
+            self.assertEqual(
+                [type(s.settings) for s in cached_environment.services],
+                [type(s.settings) for s in environment.services],
+            )
+            self.assertEqual(
+                [s.instance_name for s in cached_environment.services],
+                [s.instance_name for s in environment.services],
+            )
+
+    def test_shared_snapshot_dir_is_ignored(self):
+        Application.from_environments_yml("environments.yml")
+        os.chmod("snapshots", 0o777)
+
+        with patch.object(
+            Application, "model_validate", wraps=Application.model_validate
+        ) as model_validate:
+            Application.from_environments_yml("environments.yml")
+            model_validate.assert_called_once()
+
+    def test_changed_config_file_invalidates_snapshot(self):
+        Application.from_environments_yml("environments.yml")
+
+        with open("cnc.yml", "a") as f:
+            f.write("\n# changed\n")
+
+        with patch.object(
+            Application, "model_validate", wraps=Application.model_validate
+        ) as model_validate:
+            Application.from_environments_yml("environments.yml")
+            model_validate.assert_called_once()
+
+
+class LazyApplicationTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_config_validated_on_first_access(self):
+        app = Application.from_environments_yml("environments.yml", lazy=True)
+        main, other = app.collections[0].environments
+        self.assertFalse(main.config_loaded)
+        self.assertFalse(other.config_loaded)
+
+        self.assertEqual(len(main.services), 3)
+        self.assertTrue(main.config_loaded)
+        self.assertFalse(other.config_loaded)
+        self.assertIs(main.services[0].environment, main)
+
+        eager_app = Application.from_environments_yml("environments.yml")
+        eager_main = eager_app.collections[0].environments[0]
+        self.assertTrue(eager_main.config_loaded)
+        self.assertEqual(main.domains, eager_main.domains)
+        self.assertEqual(
+            [s.instance_name for s in main.services],
+            [s.instance_name for s in eager_main.services],
+        )
+
+    def test_lazy_render(self):
+        eager_app = Application.from_environments_yml("environments.yml")
+        eager_config_data = {
+            **eager_app.collections[0].environments[0].config_data,
+            "environment": None,
+        }
+
+        for manager_class, render in [
+            (BuildStageManager, "render_build"),
+            (DeployStageManager, "render_scripts"),
+        ]:
+            # the stage is set up before the environment's config is loaded
+            app = Application.from_environments_yml("environments.yml", lazy=True)
+            collection = app.collections[0]
+            collection._infra_outputs_cache = {}
+            environment = collection.environments[0]
+            manager = manager_class(environment)
+            self.addCleanup(manager.cleanup)
+            manager.setup()
+            self.assertFalse(environment.config_loaded)
+
+            with patch.object(
+                GCPEnvironmentCollection, "get_secret_value", return_value="secret"
+            ):
+                getattr(manager, render)()
+
+            self.assertTrue(environment.config_loaded)
+            self.assertEqual(
+                {**environment.config_data, "environment": None}, eager_config_data
+            )
+            collection.invalidate_caches()
+            self.assertEqual(collection.unique_id, eager_app.collections[0].unique_id)
+            self.assertTrue(
+                os.path.isfile(
+                    f"{manager.rendered_files_path}/"
+                    f"{manager.template_type}-app-functions.sh"
+                )
+            )
+
+    def test_unsupported_service_type(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        data["flavor"] = "lambda-lite"
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        with self.assertRaisesRegex(ValueError, "for flavor lambda-lite"):
+            Application.from_environments_yml("environments.yml")
+
+        app = Application.from_environments_yml("environments.yml", lazy=True)
+        with self.assertRaisesRegex(ValueError, "for flavor lambda-lite"):
+            app.collections[0].environments[0].services
+        self.assertFalse(app.collections[0].environments[0].config_loaded)
+
+
+class SharedAppConfigTestCase(EnvironmentBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def test_identical_config_is_shared(self):
+        main, other = self.collection.environments
+        self.assertIsNot(main.config, other.config)
+        self.assertIs(other.config.environment, other)
+
+        for main_service, other_service in zip(main.services, other.services):
+            self.assertIsNot(main_service, other_service)
+            self.assertIs(other_service.environment, other)
+            self.assertIs(other_service.config, other.config)
+            self.assertIs(other_service.settings.service, other_service)
+            self.assertIs(other_service.settings.config, other.config)
+            self.assertIs(main_service.settings.service, main_service)
+            # parsed values below services/settings are shared
+            self.assertIs(main_service.deploy, other_service.deploy)
+            self.assertNotEqual(main_service.instance_name, other_service.instance_name)
+
+        self.assertEqual(
+            self.collection.environment_by_name("main").domain,
+            "main.my-backend-test-app.testnewsite.coherencesites.com",
+        )
+        self.assertNotEqual(main.domain, other.domain)
+
+    def test_config_data_is_private(self):
+        main, other = self.collection.environments
+        with open("cnc.yml") as f:
+            data = yaml.safe_load(f)
+
+        # validation doesn't write into either environment's data
+        for environment in [main, other]:
+            self.assertEqual(
+                {
+                    k: v
+                    for k, v in environment.config_data.items()
+                    if k != "environment"
+                },
+                data,
+            )
+
+    def test_configs_shared_per_application(self):
+        app = Application.from_environments_yml("environments.yml")
+        main = app.collections[0].environments[0]
+        self.assertIsNot(
+            main.services[0].deploy, self.collection.environments[0].services[0].deploy
+        )
+
+
+class SharedAppConfigWorkersTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service-1-worker-1-task"
+
+    def test_workers_are_bound_to_their_environment(self):
+        with open("environments.yml") as f:
+            data = yaml.safe_load(f)
+
+        environment = dict(data["collections"][0]["environments"][0])
+        environment["name"] = "other"
+        data["collections"][0]["environments"].append(environment)
+        with open("environments.yml", "w") as f:
+            yaml.safe_dump(data, f)
+
+        app = Application.from_environments_yml("environments.yml")
+        main, other = app.collections[0].environments
+        main_service, other_service = (
+            main.backend_services[0],
+            other.backend_services[0],
+        )
+        self.assertTrue(other_service.settings.workers)
+
+        for main_worker, other_worker in zip(
+            main_service.settings.workers, other_service.settings.workers
+        ):
+            self.assertIsNot(main_worker, other_worker)
+            self.assertIs(main_worker.settings, main_service.settings)
+            self.assertIs(other_worker.settings, other_service.settings)
+            self.assertIs(main_worker.command, other_worker.command)
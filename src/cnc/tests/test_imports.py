@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import subprocess
+
+import cnc
+from .base_test_class import CNCBaseTestCase
+
+from cnc.logger import get_logger
+
+log = get_logger(__name__)
+
+# imported on first use only
+DEFERRED_MODULES = [
+    "boto3",
+    "google.cloud.secretmanager",
+    "IPython",
+    "rudderstack",
+    "machineid",
+    "pygohcl",
+    "tabulate",
+    "toml",
+]
+
+IMPORT_SCRIPT = """
+import sys
+import json
+import time
+
+start_time = time.perf_counter()
+import cnc.main
+seconds = time.perf_counter() - start_time
+
+from cnc.models import Application
+Application.from_environments_yml(sys.argv[1])
+
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+class ImportTimeTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service-2-db-2-envs"
+
+    def run_import(self, env_data_filepath):
+        # fresh interpreter, the test run has imported everything already
+        pythonpath = os.path.dirname(os.path.dirname(cnc.__file__))
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT, env_data_filepath],
+            env={**os.environ, "PYTHONPATH": pythonpath},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_heavy_dependencies_are_deferred(self):
+        for env_data_filepath in ["environments.yml", "environments_aws_ecs.yml"]:
+            result = self.run_import(env_data_filepath)
+            # reported only, wall-clock time is too noisy to assert on
+            log.debug(
+                f"import cnc.main took {result['seconds']:.2f}s ({env_data_filepath})"
+            )
+
+            for module in DEFERRED_MODULES:
+                self.assertNotIn(module, result["modules"])
@@ -1,8 +1,12 @@
 from unittest.mock import patch
 import os
+import zipfile
+
+import yaml
 
 from .base_test_class import CNCBaseTestCase
 from cnc.models import Application, ProvisionStageManager
+from cnc.models.template_context import LazyTemplateContext
 
 from cnc.logger import get_logger
 
@@ -52,7 +56,7 @@ class ProvisionStageCleanupSettingsTest(CNCBaseTestCase):
         manager.make_ready_for_use()
         self.assertEqual(
             sorted(os.listdir(manager.config_files_path)),
-            ["_cnc_output", "base.tf.j2", "main.tf.j2", "partials"],
+            ["_cnc_output"],
         )
 
         sample_path = f"{manager.config_files_path}/newfile.txt"
@@ -61,7 +65,7 @@ class ProvisionStageCleanupSettingsTest(CNCBaseTestCase):
         manager.make_ready_for_use()
         self.assertEqual(
             sorted(os.listdir(manager.config_files_path)),
-            ["_cnc_output", "base.tf.j2", "main.tf.j2", "partials"],
+            ["_cnc_output"],
         )
 
         with open(sample_path, "w") as file:
@@ -69,7 +73,7 @@ class ProvisionStageCleanupSettingsTest(CNCBaseTestCase):
         manager.make_ready_for_use(should_cleanup=False)
         self.assertEqual(
             sorted(os.listdir(manager.config_files_path)),
-            ["_cnc_output", "base.tf.j2", "main.tf.j2", "newfile.txt", "partials"],
+            ["_cnc_output", "newfile.txt"],
         )
 
         with open(f"{manager.config_files_path}/_cnc_output/main.tf", "w") as file:
@@ -81,6 +85,114 @@ class ProvisionStageCleanupSettingsTest(CNCBaseTestCase):
         )
 
 
+class ProvisionLazyTemplateContextTest(CNCBaseTestCase):
+    fixture_name = "backend-1-service-1-db"
+
+    def manager(self):
+        app = Application.from_environments_yml("environments.yml")
+        manager = ProvisionStageManager(app.collections[0])
+        self.addCleanup(manager.cleanup)
+        manager.setup()
+        return manager
+
+    def test_lazy_values_only_computed_when_referenced(self):
+        os.makedirs("lazy-templates")
+        with open("lazy-templates/main.tf.j2", "w") as f:
+            f.write(
+                "{% for name in names %}{% include 'partial.j2' %}{% endfor %}"
+                "{{ shlex.quote('a b') }}"
+            )
+        with open("lazy-templates/partial.j2", "w") as f:
+            f.write("{{ name }}={{ used }};")
+
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return key.upper()
+
+        context = LazyTemplateContext(
+            {"names": ["a", "b"]},
+            lazy={
+                "used": lambda: compute("used"),
+                "unused": lambda: compute("unused"),
+            },
+        )
+        manager = self.manager()
+        manager.write_template(
+            "main.tf.j2", context=context, template_directory="lazy-templates"
+        )
+
+        with open(f"{manager.rendered_files_path}/main.tf") as f:
+            self.assertEqual(f.read(), "a=USED;b=USED;'a b'")
+        self.assertEqual(computed, ["used"])
+        self.assertEqual(context.accessed_keys, {"used"})
+        self.assertEqual(context.unused_keys, {"unused"})
+
+    def test_frontend_hash_not_computed_for_gcp_templates(self):
+        manager = self.manager()
+        context = manager.template_context()
+        with patch.object(ProvisionStageManager, "frontend_hash") as frontend_hash:
+            manager.write_template(
+                manager.application.template_config.provision_filename,
+                context=context,
+            )
+
+        frontend_hash.assert_not_called()
+        self.assertIn("frontend_hash", context.unused_keys)
+        self.assertTrue(os.path.isfile(f"{manager.rendered_files_path}/main.tf"))
+
+    def test_provision_context_values(self):
+        context = self.manager().template_context()
+        self.assertEqual(context["frontend_hash"], "")
+        self.assertEqual(context["has_postgres_db"], [True])
+        self.assertEqual(context["has_mysql_db"], [])
+        self.assertEqual(
+            context.accessed_keys, {"frontend_hash", "has_postgres_db", "has_mysql_db"}
+        )
+        self.assertEqual(context.unused_keys, {"has_mssql_db"})
+
+
+class ProvisionAssetArchiveTest(CNCBaseTestCase):
+    fixture_name = "serverless-1-service"
+    env_data_filepath = "environments_serverless_1_service.yml"
+
+    def setUp(self):
+        super().setUp()
+        with open(self.env_data_filepath) as f:
+            data = yaml.safe_load(f)
+        data["template_config"] = {"template_directory": "custom"}
+        with open(self.env_data_filepath, "w") as f:
+            yaml.safe_dump(data, f)
+
+        os.makedirs("custom/provision/lambda_function_payload")
+
+    def write_payload(self, custom_files):
+        for filename, content in custom_files.items():
+            with open(f"custom/provision/lambda_function_payload/{filename}", "w") as f:
+                f.write(content)
+
+        app = Application.from_environments_yml(self.env_data_filepath)
+        manager = ProvisionStageManager(app.collections[0])
+        self.addCleanup(manager.cleanup)
+        manager.setup()
+
+        return zipfile.ZipFile(
+            f"{manager.rendered_files_path}/lambda_function_payload.zip"
+        )
+
+    def test_custom_assets_added_to_defaults(self):
+        with self.write_payload({"helpers.py": "# custom helpers"}) as archive:
+            self.assertEqual(archive.namelist(), ["helpers.py", "lambda_function.py"])
+            self.assertEqual(archive.read("helpers.py"), b"# custom helpers")
+            self.assertIn(b"def lambda_handler", archive.read("lambda_function.py"))
+
+    def test_custom_assets_override_defaults(self):
+        with self.write_payload({"lambda_function.py": "# custom handler"}) as archive:
+            self.assertEqual(archive.namelist(), ["lambda_function.py"])
+            self.assertEqual(archive.read("lambda_function.py"), b"# custom handler")
+
+
 class AWSProvisionStageSmokeTest(ProvisionStageSmokeTest):
     env_data_filepath = "environments_aws_ecs.yml"
 
@@ -0,0 +1,47 @@
+import os
+from unittest.mock import patch
+
+from .base_test_class import CNCBaseTestCase
+from cnc.commands.render import render_all
+from cnc.models import Application
+from cnc.models.providers.google.environment_collection import GCPEnvironmentCollection
+
+
+class RenderAllTestCase(CNCBaseTestCase):
+    fixture_name = "backend-2-service-1-db"
+
+    def test_render_all_stages(self):
+        app = Application.from_environments_yml("environments.yml")
+        rendered = {}
+
+        def write_output(rendered_files_path, arcname):
+            rendered[arcname] = sorted(os.listdir(rendered_files_path))
+
+        with patch.object(
+            GCPEnvironmentCollection, "get_secret_value", return_value="secretvalue"
+        ):
+            timings, failed = render_all(app, write_output)
+
+        self.assertEqual(failed, [])
+        self.assertEqual(
+            list(rendered.keys()),
+            ["preview/provision", "preview/main/build", "preview/main/deploy"],
+        )
+        self.assertIn("main.tf", rendered["preview/provision"])
+        self.assertIn("build-app.sh", rendered["preview/main/build"])
+        self.assertIn("deploy-api.sh", rendered["preview/main/deploy"])
+        self.assertEqual(
+            {stage: timing["count"] for stage, timing in timings.items()},
+            {"provision": 1, "build": 1, "deploy": 1},
+        )
+
+    def test_render_failures_collected(self):
+        app = Application.from_environments_yml("environments.yml")
+
+        with patch("cnc.commands.render.render_build", side_effect=Exception("broken")):
+            timings, failed = render_all(
+                app, lambda *args: None, stages=["build"], collection_name="preview"
+            )
+
+        self.assertEqual(failed, ["preview/main/build"])
+        self.assertEqual(timings["build"]["count"], 0)
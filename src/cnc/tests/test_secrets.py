@@ -0,0 +1,155 @@
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import boto3
+from botocore.stub import Stubber
+
+from .base_test_class import CNCBaseTestCase
+from cnc.models import Application, DeployStageManager
+from cnc.models.providers.amazon.environment_collection import (
+    AWSEnvironmentCollection,
+)
+from cnc.models.providers.amazon.secrets import SecretsResolver
+from cnc.models.providers.google.environment_collection import (
+    GCPEnvironmentCollection,
+)
+
+from cnc.logger import get_logger
+
+log = get_logger(__name__)
+
+
+def secret_value(name, secret_string):
+    return {
+        "ARN": f"arn:aws:secretsmanager:us-east-1:123456789012:secret:{name}-AbCdEf",
+        "Name": name,
+        "SecretString": secret_string,
+    }
+
+
+class SecretsResolverTestCase(unittest.TestCase):
+    def setUp(self):
+        # local stand-in for Secrets Manager, fails on any unexpected call
+        client = boto3.client(
+            "secretsmanager",
+            region_name="us-east-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.stubber = Stubber(client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        self.secrets = SecretsResolver(client=client)
+
+    def test_prefetch_in_batches(self):
+        secret_ids = [f"secret-{i:02}" for i in range(25)]
+        for batch in [secret_ids[:20], secret_ids[20:]]:
+            self.stubber.add_response(
+                "batch_get_secret_value",
+                {
+                    "SecretValues": [
+                        secret_value(name, json.dumps({"user": name, "password": "pw"}))
+                        for name in batch
+                    ],
+                    "Errors": [],
+                },
+                {"SecretIdList": batch},
+            )
+
+        self.secrets.prefetch(
+            [f"{name}:user" for name in secret_ids]
+            + [f"{name}:password" for name in secret_ids]
+        )
+        self.stubber.assert_no_pending_responses()
+
+        # served from memory
+        self.assertEqual(self.secrets.get_secret_value("secret-03:user"), "secret-03")
+        self.assertEqual(self.secrets.get_secret_value("secret-03:password"), "pw")
+        self.assertEqual(
+            json.loads(self.secrets.get_secret_value("secret-24"))["user"], "secret-24"
+        )
+
+        # nothing left to fetch
+        self.secrets.prefetch(secret_ids)
+
+    def test_fall_back_to_single_gets(self):
+        self.stubber.add_client_error(
+            "batch_get_secret_value",
+            service_error_code="AccessDeniedException",
+            expected_params={"SecretIdList": ["foo"]},
+        )
+        self.stubber.add_response(
+            "get_secret_value",
+            secret_value("foo", "bar"),
+            {"SecretId": "foo"},
+        )
+
+        self.secrets.prefetch(["foo"])
+        self.assertEqual(self.secrets.get_secret_value("foo"), "bar")
+        self.assertEqual(self.secrets.get_secret_value("foo"), "bar")
+        self.stubber.assert_no_pending_responses()
+
+    def test_client_error_is_not_retried(self):
+        secrets = SecretsResolver()
+        with patch("boto3.client", side_effect=ValueError("no region")) as client:
+            for _ in range(2):
+                with self.assertRaisesRegex(ValueError, "no region"):
+                    secrets.get_secret_value("foo")
+
+        client.assert_called_once()
+
+
+class DeploySecretsPrefetchTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service-1-db"
+    env_data_filepath = "environments_aws_ecs.yml"
+
+    def test_secrets_prefetched_before_render(self):
+        app = Application.from_environments_yml(self.env_data_filepath)
+        environment = app.collections[0].environments[0]
+        deployer = DeployStageManager(environment)
+        self.addCleanup(deployer.cleanup)
+        deployer.setup()
+
+        with patch.object(
+            AWSEnvironmentCollection, "prefetch_secrets"
+        ) as prefetch_secrets, patch.object(
+            AWSEnvironmentCollection, "get_secret_value", return_value="secret"
+        ):
+            deployer.render_scripts()
+
+        prefetch_secrets.assert_called_once()
+        secret_ids = prefetch_secrets.call_args[0][0]
+        for service in environment.services:
+            for secret in service.environment_secrets:
+                self.assertIn(secret.secret_id, secret_ids)
+
+
+class GCPSecretManagerClientTestCase(CNCBaseTestCase):
+    fixture_name = "backend-1-service"
+
+    def test_client_shared_between_threads(self):
+        app = Application.from_environments_yml("environments.yml")
+        collection = app.collections[0]
+        self.assertIsInstance(collection, GCPEnvironmentCollection)
+
+        with patch(
+            "google.cloud.secretmanager.SecretManagerServiceClient"
+        ) as client_class:
+            client = client_class.return_value
+            client.access_secret_version.return_value.payload.data = b"value"
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                values = list(
+                    executor.map(collection.get_secret_value, ["a", "b", "c", "d"])
+                )
+
+        self.assertEqual(values, ["value"] * 4)
+        client_class.assert_called_once()
+        self.assertEqual(client.access_secret_version.call_count, 4)
+        client.access_secret_version.assert_any_call(
+            request={
+                "name": f"projects/{collection.account_id}/secrets/a/versions/latest"
+            }
+        )
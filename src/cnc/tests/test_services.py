@@ -45,6 +45,16 @@ class ServiceProviderLinksTestCase(CNCBaseTestCase):
             "https://console.cloud.google.com/run/detail/us-east1/c18d7ebb6d-my-ba-eview-main-app/revisions?project=foo-bar-123",
         )
 
+    def test_metadata_and_templates_are_reused(self):
+        links = self.service.provider_links
+
+        with patch("builtins.open") as open_mock, patch(
+            "jinja2.Environment.from_string"
+        ) as from_string:
+            self.assertEqual(self.service.provider_links, links)
+            open_mock.assert_not_called()
+            from_string.assert_not_called()
+
 
 class ServiceWorkerTaskCpuMemoryTestCase(CNCBaseTestCase):
     fixture_name = "backend-1-service-1-worker-1-task"
@@ -172,3 +182,51 @@ class ServiceEnvironmentItemsTestCase(CNCBaseTestCase):
 
         service_vars = self.service.environment_variables
         self.assertEqual(len(service_vars), 15)
+
+    def test_managed_items_are_built_once(self):
+        db = self.environment.service_by_name("db1")
+        config = self.environment.config
+
+        def item_names():
+            return [
+                [item.name for item in items]
+                for items in [
+                    self.service.environment_variables,
+                    self.service.environment_secrets,
+                    db.environment_variables,
+                    db.environment_secrets,
+                ]
+            ]
+
+        names = item_names()
+        with patch.object(type(config), "variable_object") as variable_object:
+            self.assertEqual(item_names(), names)
+            variable_object.assert_not_called()
+
+        # managed items are shared between services
+        self.assertIs(
+            config.managed_environment_variables_for_service(db)[0],
+            config.managed_environment_variables_for_service(self.service)[0],
+        )
+
+    def test_managed_items_cached_per_service_object(self):
+        config = self.environment.config
+        managed_items = self.environment.managed_items
+
+        # an equal copy that isn't one of the config's services
+        copy = self.service.model_copy()
+        self.assertEqual(
+            [
+                (item.name, item.value)
+                for item in config.managed_environment_variables_for_service(copy)
+            ],
+            [
+                (item.name, item.value)
+                for item in config.managed_environment_variables_for_service(
+                    self.service
+                )
+            ],
+        )
+
+        # the cache keeps the copy alive, so its id can't be reused
+        self.assertIs(managed_items._variables[id(copy)][0], copy)
@@ -0,0 +1,32 @@
+import os
+
+TRUTHY_ENV_VALUES = ["1", "true", "True", "TRUE", "yes", "Y", "y", "Yes", "YES"]
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+
+    return value in TRUTHY_ENV_VALUES
+
+
+def cache_directory(*parts):
+    """
+    Directory for on-disk caches shared between cnc invocations.
+    Uses CNC_CACHE_DIR if set, otherwise $XDG_CACHE_HOME/cnc (~/.cache/cnc)
+    """
+    base_dir = os.environ.get("CNC_CACHE_DIR")
+    if not base_dir:
+        xdg_cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+            "~/.cache"
+        )
+        base_dir = os.path.join(xdg_cache_dir, "cnc")
+
+    return os.path.join(base_dir, *parts)
+
+
+def is_private(path):
+    """Only trust files the current user owns and nobody else can write"""
+    stat_result = os.stat(path)
+    return stat_result.st_uid == os.getuid() and not stat_result.st_mode & 0o022
@@ -0,0 +1,61 @@
+import os
+import stat
+import hashlib
+import tempfile
+
+
+class AtomicWriter:
+    """
+    Writes to a temp file next to path and renames it over path on commit,
+    so readers (terraform, bash) never see a half-written file. Keeps the
+    mode of an existing file and tracks the sha256 of what was written.
+    """
+
+    def __init__(self, path, binary=False):
+        self.path = path
+        self.binary = binary
+        self.hash = hashlib.sha256()
+
+        directory = os.path.dirname(path) or "."
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+        )
+        self.file = os.fdopen(fd, "wb" if binary else "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        elif not self.file.closed:
+            self.commit()
+
+    def write(self, content):
+        self.hash.update(content if self.binary else content.encode())
+        self.file.write(content)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+    def commit(self):
+        self.file.close()
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+
+        os.chmod(self.tmp_path, mode)
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def atomic_write(path, content):
+    with AtomicWriter(path, binary=isinstance(content, bytes)) as f:
+        f.write(content)
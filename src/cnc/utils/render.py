@@ -0,0 +1,54 @@
+import re
+from functools import lru_cache
+
+from jinja2 import Template
+
+EXCESS_NEWLINES = re.compile(r"\n\s*\n")
+
+# rendered chunks are tiny (one per template expression), so batch them
+# up before cleaning & writing
+CHUNK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=256)
+def inline_template(source):
+    """jinja2.Template(source), compiled once per (recently used) source"""
+    return Template(source)
+
+
+def strip_excess_newlines(text):
+    return EXCESS_NEWLINES.sub("\n", text)
+
+
+def collapse_blank_lines(chunks, chunk_size=CHUNK_SIZE):
+    """
+    Streaming version of strip_excess_newlines, e.g. for the output of
+    template.generate(). Yields the same text the non-streaming version
+    would produce for "".join(chunks), without holding all of it in memory.
+
+    A blank-line match can only span a run of whitespace, so everything up
+    to the last non-whitespace character can be cleaned & emitted, and the
+    trailing whitespace is carried over to the next batch.
+    """
+    pending = []
+    pending_size = 0
+    carry = ""
+
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size < chunk_size:
+            continue
+
+        text = carry + "".join(pending)
+        pending = []
+        pending_size = 0
+
+        head = text.rstrip()
+        carry = text[len(head) :]
+        if head:
+            yield strip_excess_newlines(head)
+
+    text = carry + "".join(pending)
+    if text:
+        yield strip_excess_newlines(text)
@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+
+import yaml
+
+# libyaml's C parser/emitter are much faster than the pure python ones,
+# fall back if pyyaml was built without it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+_parsed_files = {}
+_parsed_files_lock = threading.Lock()
+
+
+def safe_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_dump(data, stream=None, **kwds):
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwds)
+
+
+class OrderedSafeLoader(SafeLoader):
+    """Loads mappings as OrderedDicts"""
+
+
+def _construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node))
+
+
+OrderedSafeLoader.add_constructor(
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _construct_ordered_mapping
+)
+
+
+class OrderedSafeDumper(SafeDumper):
+    """Dumps OrderedDicts as plain mappings, keeping their order"""
+
+
+def _represent_ordered_dict(dumper, data):
+    return dumper.represent_dict(data.items())
+
+
+OrderedSafeDumper.add_representer(OrderedDict, _represent_ordered_dict)
+
+
+def ordered_load(stream):
+    return yaml.load(stream, Loader=OrderedSafeLoader)
+
+
+def ordered_dump(data, stream=None, **kwds):
+    return yaml.dump(data, stream, Dumper=OrderedSafeDumper, **kwds)
+
+
+def load_yaml_file(path):
+    """
+    safe_load a file, parsing it once per (path, mtime, size).
+    Every call gets its own copy so callers can mutate the result.
+    """
+    path = os.path.realpath(path)
+    stat_result = os.stat(path)
+    key = (stat_result.st_mtime_ns, stat_result.st_size)
+
+    with _parsed_files_lock:
+        cached = _parsed_files.get(path)
+
+    if cached and cached[0] == key:
+        return copy_yaml_data(cached[1])
+
+    with open(path) as yaml_file:
+        data = safe_load(yaml_file)
+
+    with _parsed_files_lock:
+        _parsed_files[path] = (key, data)
+
+    return copy_yaml_data(data)
+
+
+def clear_yaml_cache():
+    with _parsed_files_lock:
+        _parsed_files.clear()
+
+
+def copy_yaml_data(data):
+    """Deep copy of parsed yaml (scalars are immutable so they're shared)"""
+    if isinstance(data, dict):
+        return {key: copy_yaml_data(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_yaml_data(value) for value in data]
+    return data